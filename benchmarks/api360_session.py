@@ -0,0 +1,60 @@
+"""Requests per second of API360 with one ClientSession per request (before) and with pooled session (after).
+
+Run: python -m benchmarks.api360_session [--requests 2000] [--concurrency 20]
+"""
+
+import argparse
+import asyncio
+import logging
+from time import perf_counter
+
+from benchmarks.stand_in import StandInServer
+from lib.api360 import API360
+
+
+async def per_request_session(api: API360, paths: list[str], concurrency: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def fetch(path):
+        async with sem:
+            await API360._send_request(path, api._headers)
+
+    start = perf_counter()
+    await asyncio.gather(*(fetch(path) for path in paths))
+    return len(paths) / (perf_counter() - start)
+
+
+async def pooled_session(api: API360, paths: list[str], concurrency: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def fetch(path):
+        async with sem:
+            await api._request(path)
+
+    start = perf_counter()
+    async with api:
+        await asyncio.gather(*(fetch(path) for path in paths))
+    return len(paths) / (perf_counter() - start)
+
+
+async def main(requests: int, concurrency: int):
+    async with StandInServer(total=10) as server:
+        api = API360('token', 'org', log_level=logging.WARNING, connection_limit=concurrency, base_url=server.base_url,
+                     requests_per_second=0)
+        paths = [f'{server.base_url}/directory/v1/org/org/users/{1130000000000000 + i % 10}' for i in range(requests)]
+
+        before = await per_request_session(api, paths, concurrency)
+        after = await pooled_session(api, paths, concurrency)
+
+    print(f'Requests: {requests}, concurrency: {concurrency}')
+    print(f'Session per request: {before:10.1f} req/s')
+    print(f'Pooled session:      {after:10.1f} req/s')
+    print(f'Speedup:             {after / before:10.2f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
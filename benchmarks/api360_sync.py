@@ -0,0 +1,63 @@
+"""Throughput of API360 synchronous methods with asyncio.run per call (before) and with the long-lived facade loop (after).
+
+Run: python -m benchmarks.api360_sync [--requests 1000] [--threads 20]
+"""
+
+import argparse
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from benchmarks.stand_in import StandInServer
+from lib.api360 import API360
+from lib.types import User
+
+
+def asyncio_run_per_call(api: API360, user_ids: list[str]) -> float:
+    start = perf_counter()
+    for user_id in user_ids:
+        User.from_dict(asyncio.run(API360._send_request(f'{api._url}org/users/{user_id}', api._headers)))
+    return len(user_ids) / (perf_counter() - start)
+
+
+def facade(api: API360, user_ids: list[str]) -> float:
+    start = perf_counter()
+    for user_id in user_ids:
+        api.get_user(user_id)
+    return len(user_ids) / (perf_counter() - start)
+
+
+def facade_threads(api: API360, user_ids: list[str], threads: int) -> float:
+    start = perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(api.get_user, user_ids))
+    return len(user_ids) / (perf_counter() - start)
+
+
+def main(requests: int, threads: int):
+    server = StandInServer(total=100)
+    server_loop = asyncio.new_event_loop()
+    threading.Thread(target=server_loop.run_forever, daemon=True).start()
+    asyncio.run_coroutine_threadsafe(server.start(), server_loop).result()
+
+    user_ids = [str(1130000000000000 + i % 100) for i in range(requests)]
+    with API360('token', 'org', log_level=logging.WARNING, base_url=server.base_url, requests_per_second=0) as api:
+        before = asyncio_run_per_call(api, user_ids)
+        after = facade(api, user_ids)
+        after_threads = facade_threads(api, user_ids, threads)
+
+    asyncio.run_coroutine_threadsafe(server.stop(), server_loop).result()
+    print(f'Requests: {requests}')
+    print(f'asyncio.run per call:           {before:10.1f} req/s')
+    print(f'Facade loop:                    {after:10.1f} req/s')
+    print(f'Facade loop, {threads:3d} threads:       {after_threads:10.1f} req/s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=20)
+    args = parser.parse_args()
+    main(args.requests, args.threads)
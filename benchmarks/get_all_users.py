@@ -0,0 +1,50 @@
+"""Full users export time with serial page fetching (before) and concurrent rate-limited fetching (after).
+
+Run: python -m benchmarks.get_all_users [--users 10000] [--latency 0.05] [--rps 50] [--in-flight 10]
+"""
+
+import argparse
+import asyncio
+import logging
+from time import perf_counter
+
+from benchmarks.stand_in import StandInServer
+from lib.api360 import API360
+
+
+async def serial(api: API360) -> int:
+    users = []
+    _, total_pages = await api.count_pages()
+    for page in range(1, total_pages + 1):
+        users.extend((await api.get_users_page(page)).users)
+        await asyncio.sleep(0.1)
+    return len(users)
+
+
+async def main(total: int, latency: float, rps: float, in_flight: int):
+    async with StandInServer(total=total, latency=latency) as server:
+        api = API360('token', 'org', log_level=logging.WARNING, base_url=server.base_url,
+                     requests_per_second=rps, max_in_flight=in_flight)
+        async with api:
+            start = perf_counter()
+            count = await serial(api)
+            before = perf_counter() - start
+
+            start = perf_counter()
+            assert len(await api.get_all_users_async()) == count
+            after = perf_counter() - start
+
+    print(f'Users: {total}, server latency: {latency}s, rps: {rps}, in flight: {in_flight}')
+    print(f'Serial pages:     {before:8.2f} s')
+    print(f'Concurrent pages: {after:8.2f} s')
+    print(f'Speedup:          {before / after:8.2f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--rps', type=float, default=50)
+    parser.add_argument('--in-flight', type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.latency, args.rps, args.in_flight))
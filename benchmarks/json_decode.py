@@ -0,0 +1,35 @@
+"""Decode time of users pages with every available JSON decoder.
+
+Run: python -m benchmarks.json_decode [--users 20000]
+"""
+
+import argparse
+from time import perf_counter
+
+from benchmarks.types_memory import pages
+from lib import jsonutil
+from lib.types import UsersPage
+
+
+def main(total: int):
+    raw_pages = [raw_page.encode() for raw_page in pages(total)]
+    print(f'Users: {total}, pages: {len(raw_pages)}, {sum(map(len, raw_pages)) / 1024 ** 2:.1f} MB')
+    for name in jsonutil.available():
+        jsonutil.use(name)
+        start = perf_counter()
+        for raw_page in raw_pages:
+            jsonutil.loads(raw_page)
+        loads_time = perf_counter() - start
+
+        start = perf_counter()
+        for raw_page in raw_pages:
+            jsonutil.decode(raw_page, UsersPage)
+        decode_time = perf_counter() - start
+        print(f'{name:8s} loads: {loads_time:6.3f} s   loads + UsersPage: {decode_time:6.3f} s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=20000)
+    args = parser.parse_args()
+    main(args.users)
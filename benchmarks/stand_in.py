@@ -0,0 +1,160 @@
+"""Local stand-in for api360.yandex.net used by benchmarks. Serves synthetic organization users."""
+
+import asyncio
+
+from aiohttp import web
+
+
+def synthetic_user(index: int) -> dict:
+    uid = str(1130000000000000 + index)
+    return {
+        'id': uid,
+        'nickname': f'user{index}',
+        'departmentId': 1,
+        'email': f'user{index}@example.org',
+        'name': {'first': f'First{index}', 'last': f'Last{index}', 'middle': ''},
+        'isEnabled': True,
+        'gender': 'male',
+        'position': 'Engineer',
+        'avatarId': '',
+        'about': '',
+        'birthday': '1990-01-01',
+        'externalId': '',
+        'isAdmin': False,
+        'isRobot': False,
+        'isDismissed': False,
+        'timezone': 'Europe/Moscow',
+        'language': 'ru',
+        'createdAt': '2024-01-01T00:00:00.000Z',
+        'updatedAt': '2024-01-01T00:00:00.000Z',
+        'displayName': f'First{index} Last{index}',
+        'groups': [1, 2],
+        'contacts': [
+            {'type': 'email', 'value': f'user{index}@example.org', 'main': True, 'alias': False, 'synthetic': True},
+            {'type': 'staff', 'value': f'https://staff/user{index}', 'main': False, 'alias': False, 'synthetic': True},
+        ],
+        'aliases': [f'alias{index}'],
+    }
+
+
+def synthetic_group(group_id: int, members: list[dict]) -> dict:
+    return {
+        'id': group_id,
+        'name': f'Group {group_id}',
+        'type': 'generic',
+        'description': '',
+        'membersCount': len(members),
+        'label': f'group{group_id}',
+        'email': f'group{group_id}@example.org',
+        'aliases': [],
+        'externalId': '',
+        'removed': False,
+        'members': members,
+        'adminIds': [],
+        'authorId': '',
+        'memberOf': [],
+        'createdAt': '2024-01-01T00:00:00.000Z',
+    }
+
+
+class StandInServer:
+    """Serve users and groups of a synthetic organization on localhost.
+
+    Args:
+        total (int): Number of users in organization
+        latency (float): Artificial delay per request in seconds
+        groups (dict[int, list[dict]], optional): Group members ({'id': ..., 'type': 'user'|'group'|'department'}) by group ID
+    """
+
+    def __init__(self, total: int = 1000, latency: float = 0.0, groups: dict[int, list[dict]] = None):
+        self.total = total
+        self.latency = latency
+        self.groups = groups if groups is not None else {}
+        self.requests = 0
+        self.base_url = ''
+        self._runner = None
+
+    async def _users(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        per_page = int(request.query.get('perPage', 10))
+        page = int(request.query.get('page', 1))
+        pages = (self.total + per_page - 1) // per_page
+        first = (page - 1) * per_page
+        users = [synthetic_user(i) for i in range(first, min(first + per_page, self.total))]
+        return web.json_response({'users': users, 'page': page, 'pages': pages, 'perPage': per_page, 'total': self.total})
+
+    async def _user(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.json_response(synthetic_user(int(request.match_info['user_id']) - 1130000000000000))
+
+    def _short_user(self, uid: str) -> dict:
+        user = synthetic_user(int(uid) - 1130000000000000)
+        return {key: user[key] for key in ('id', 'nickname', 'departmentId', 'email', 'name', 'gender', 'position', 'avatarId')}
+
+    async def _groups(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        per_page = int(request.query.get('perPage', 10))
+        page = int(request.query.get('page', 1))
+        group_ids = sorted(self.groups)
+        pages = (len(group_ids) + per_page - 1) // per_page
+        first = (page - 1) * per_page
+        groups = [synthetic_group(group_id, self.groups[group_id]) for group_id in group_ids[first:first + per_page]]
+        return web.json_response({'groups': groups, 'page': page, 'pages': pages, 'perPage': per_page, 'total': len(group_ids)})
+
+    async def _group_members(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        members = self.groups.get(int(request.match_info['group_id']), [])
+        return web.json_response({
+            'groups': [
+                {'id': member['id'], 'name': f'Group {member["id"]}', 'membersCount': len(self.groups.get(member['id'], []))}
+                for member in members if member['type'] == 'group'
+            ],
+            'users': [self._short_user(member['id']) for member in members if member['type'] == 'user'],
+        })
+
+    async def _add_member(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        body = await request.json()
+        members = self.groups.setdefault(int(request.match_info['group_id']), [])
+        members.append({'id': body['id'], 'type': body['type']})
+        return web.json_response({'id': body['id'], 'type': body['type'], 'added': True})
+
+    async def _delete_member(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        group_id = int(request.match_info['group_id'])
+        member_id = request.match_info['member_id']
+        self.groups[group_id] = [member for member in self.groups.get(group_id, []) if str(member['id']) != member_id]
+        return web.json_response({'id': member_id, 'type': request.match_info['member_type'], 'deleted': True})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/directory/v1/org/{org_id}/users', self._users)
+        app.router.add_get('/directory/v1/org/{org_id}/users/{user_id}', self._user)
+        app.router.add_get('/directory/v1/org/{org_id}/groups', self._groups)
+        app.router.add_post('/directory/v1/org/{org_id}/groups/{group_id}/members', self._add_member)
+        app.router.add_delete('/directory/v1/org/{org_id}/groups/{group_id}/members/{member_type}/{member_id}', self._delete_member)
+        app.router.add_get('/directory/v2/org/{org_id}/groups/{group_id}/members', self._group_members)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f'http://127.0.0.1:{port}'
+        return self
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.stop()
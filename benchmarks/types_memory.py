@@ -0,0 +1,51 @@
+"""Memory held by parsed organization users and parse time.
+
+Run: python -m benchmarks.types_memory [--users 100000]
+"""
+
+import argparse
+import gc
+import json
+import tracemalloc
+from time import perf_counter
+
+from benchmarks.stand_in import synthetic_user
+from lib.types import UsersPage
+
+
+def pages(total: int, per_page: int = 100):
+    for first in range(0, total, per_page):
+        users = [synthetic_user(i) for i in range(first, min(first + per_page, total))]
+        yield json.dumps({'users': users, 'page': 1, 'pages': 1, 'perPage': per_page, 'total': total})
+
+
+def main(total: int):
+    raw_pages = list(pages(total))
+    gc.collect()
+
+    tracemalloc.start()
+    start = perf_counter()
+    users = []
+    for raw_page in raw_pages:
+        users.extend(UsersPage.from_dict(json.loads(raw_page)).users)
+    parse_time = perf_counter() - start
+    gc.collect()
+    held, peak = tracemalloc.get_traced_memory()
+
+    start = perf_counter()
+    emails = sum(1 for user in users if user.email and user.name.first)
+    access_time = perf_counter() - start
+    tracemalloc.stop()
+
+    print(f'Users: {len(users)}')
+    print(f'Parse time:        {parse_time:8.2f} s')
+    print(f'Field access time: {access_time:8.3f} s ({emails} users)')
+    print(f'Memory held:       {held / 1024 ** 2:8.1f} MB ({held / len(users):.0f} bytes per user)')
+    print(f'Peak memory:       {peak / 1024 ** 2:8.1f} MB')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=100000)
+    args = parser.parse_args()
+    main(args.users)
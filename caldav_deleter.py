@@ -2,7 +2,6 @@ import argparse
 import asyncio
 import csv
 import logging
-import os
 import sys
 import caldav
 from argparse import ArgumentParser
@@ -13,7 +12,8 @@ from typing import List, Dict
 
 from dotenv import load_dotenv
 
-from lib.api360 import API360
+from lib.tokens import TOKEN_TYPE_UID
+from tools import token_cache
 
 load_dotenv()
 
@@ -75,19 +75,11 @@ async def delete_user_calendar(token: str, email: str):
     return ttl_calendars
 
 async def get_service_token(user_id: str) -> str:
-    response = {}
-
     try:
-        response = await API360.get_service_app_token_async(
-            client_id=os.getenv('CLIENT_ID'),
-            client_secret=os.getenv('CLIENT_SECRET'),
-            subject_token=user_id,
-            subject_token_type='urn:yandex:params:oauth:token-type:uid'
-        )
+        return await token_cache().get_async(user_id, TOKEN_TYPE_UID)
     except Exception as e:
         log.debug(f'Failed to get service app token: {e}')
         exit(1)
-    return response['access_token']
 
 
 async def main():
@@ -99,6 +91,7 @@ async def main():
     confirm = input('Вы уверены что хотите УДАЛИТЬ календари? (y/n)')
 
     if confirm == 'y':
+        await token_cache().prefetch([user.get('ID') for user in users], TOKEN_TYPE_UID)
         for user in users:
             log.debug(f"*** Старт удаления календарей для: {user.get('Email')}")
             token = await get_service_token(user_id=user.get('ID'))
@@ -6,7 +6,7 @@ import time
 from dotenv import load_dotenv
 import requests
 
-from tools import get_service_app_token, logger, read_users_csv
+from tools import get_service_app_token, logger, prefetch_service_app_tokens, read_users_csv
 
 load_dotenv()
 
@@ -69,6 +69,9 @@ if __name__ == '__main__':
 
     choice = input('Выберите действие: ')
 
+    if choice in ('1', '2'):
+        prefetch_service_app_tokens([user.get('Email') for user in users if user.get('Email')])
+
     for user in users:
         email = user.get('Email')
         if email:
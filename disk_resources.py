@@ -3,119 +3,173 @@ import argparse
 import csv
 import logging
 from textwrap import dedent
+import asyncio
+from collections import deque
 from time import time
 from typing import Dict, List
 from tqdm import tqdm
 
 from dotenv import load_dotenv
-from lib.disk360 import DiskClient, PublicResourcesList
-from tools import get_service_app_token, logger
+from lib.disk360 import AsyncDiskClient, PublicAccess
+from lib.throttle import AdaptiveRateController, TokenBucket
+from lib.tokens import TOKEN_TYPE_EMAIL
+from tools import logger, token_cache
 
 log: logging.Logger = logger(logger_name = 'DISK', file_name = 'disk_report.log', log_level = logging.INFO, no_console=True)
 
+REPORT_FIELDS = ['email', 'path', 'access_type', 'rights', 'user_id', 'external_user']
+
+
 def arg_parser() -> ArgumentParser:
     parser = ArgumentParser(
         description=dedent("""
         Скрипт выгружает данные о ресурсах на диске, которыми поделился пользователь в файл disk_report.csv
         Параметры:
         --users <file.csv> - файл со списком пользователей.
+        --workers <N> - количество одновременных запросов к Диску. По умолчанию 10.
+        --rps <N> - максимальное количество запросов к Диску в секунду. По умолчанию 20.
         
         """),
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
     parser.add_argument('--users', type=str, required=True, help='CSV файл со списком пользователей')
+    parser.add_argument('--workers', type=int, default=10, help='Количество одновременных запросов')
+    parser.add_argument('--rps', type=float, default=20, help='Максимальное количество запросов в секунду')
     return parser
 
-def get_user_shared_resources(email: str, token: str, client: DiskClient):
+def access_to_row(email: str, resource_path: str, access: PublicAccess) -> dict | None:
+    if access.access_type == 'macro':
+        if access.macros == 'all':
+            log.debug(f"Есть внешний доступ! Права: {access.rights}")
+            return {
+                'email': email,
+                'path': resource_path,
+                'access_type': 'public',
+                'rights': access.rights,
+                'user_id': '',
+                'external_user': ''
+
+            }
+        elif access.macros == 'employees':
+            log.debug(f"Только внутри компании. Права: {access.rights}")
+            return {
+                'email': email,
+                'path': resource_path,
+                'access_type': 'employees',
+                'rights': access.rights,
+                'user_id': '',
+                'external_user': ''
+            }
+        return None
+    elif access.access_type == 'user':
+        log.debug(f"Доступ сотруднику: {access.user_id} права: {access.rights}")
+        return {
+            'email': email,
+            'path': resource_path,
+            'access_type': 'user',
+            'rights': access.rights,
+            'user_id': access.user_id,
+            'external_user': not access.org_id
+        }
+    else:
+        log.debug(f"Другой доступ: {access}")
+        return {
+            'email': email,
+            'path': resource_path,
+            'access_type': access.access_type,
+            'rights': access.rights,
+            'user_id': access.user_id,
+            'external_user': not access.org_id,
+            
+        }
 
-    resources_list: PublicResourcesList = client.get_public_resources(token=token, limit=100, offset=0)
+async def get_user_shared_resources(email: str, token: str, client: AsyncDiskClient, settings_slots: asyncio.Semaphore) -> list[dict]:
+    """List user shared resources and fetch their public settings while listing goes on.
+    settings_slots limits settings requests waiting or in flight across all users.
 
-    resource_items = resources_list.items
-    with open('disk_report.csv', 'a', newline='', encoding='utf-8') as f:
-        w = csv.DictWriter(f, ['email',
-                               'path',
-                               'access_type',
-                               'rights',
-                               'user_id',
-                               'external_user'])
-        
-        for resource in resource_items:
+    Returns:
+        list[dict]: Report rows in listing order without duplicates
+    """
+
+    async def resource_rows(resource_path: str) -> list[dict]:
+        try:
+            res = await client.get_public_settings(token, resource_path)
+        finally:
+            settings_slots.release()
+        return [row for row in (access_to_row(email, resource_path, access) for access in res.public_accesses) if row]
 
+    tasks: dict[str, asyncio.Task] = {}
+    try:
+        async for resource in client.iter_public_resources(token=token, limit=100, offset=0):
             log.debug(f'*** Ресурс {resource.type}: {resource.name} путь: {resource.path}')
-            
             resource_path = resource.path[5:]
-            res = client.get_public_settings(token, resource_path)
-            accesses = res.public_accesses
-            for access in accesses:
-                if access.access_type == 'macro':
-                    if access.macros == 'all':
-                        log.debug(f"Есть внешний доступ! Права: {access.rights}")
-                        w.writerow({
-                            'email': email,
-                            'path': resource_path,
-                            'access_type': 'public',
-                            'rights': access.rights,
-                            'user_id': '',
-                            'external_user': ''
-
-                        })
-                    elif access.macros == 'employees':
-                        log.debug(f"Только внутри компании. Права: {access.rights}")
-                        w.writerow({
-                            'email': email,
-                            'path': resource_path,
-                            'access_type': 'employees',
-                            'rights': access.rights,
-                            'user_id': '',
-                            'external_user': ''
-                        })
-                elif access.access_type == 'user':
-                    log.debug(f"Доступ сотруднику: {access.user_id} права: {access.rights}")
-                    w.writerow({
-                        'email': email,
-                        'path': resource_path,
-                        'access_type': 'user',
-                        'rights': access.rights,
-                        'user_id': access.user_id,
-                        'external_user': not access.org_id
-                    })
-                else:
-                    log.debug(f"Другой доступ: {access}")
-                    w.writerow({
-                        'email': email,
-                        'path': resource_path,
-                        'access_type': access.access_type,
-                        'rights': access.rights,
-                        'user_id': access.user_id,
-                        'external_user': not access.org_id,
-                        
-                    })
-
-
-def main(users: List[Dict]):
-    client = DiskClient()
+            # Listing by offset can return the same resource twice if resources are published meanwhile
+            if resource_path not in tasks:
+                await settings_slots.acquire()
+                tasks[resource_path] = asyncio.create_task(resource_rows(resource_path))
+        resources_rows = await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        raise
+
+    rows: list[dict] = []
+    seen: set[tuple] = set()
+    for resource_rows_list in resources_rows:
+        for row in resource_rows_list:
+            key = tuple(row.values())
+            if key not in seen:
+                seen.add(key)
+                rows.append(row)
+    return rows
+
+
+async def process_user(user: Dict, client: AsyncDiskClient, settings_slots: asyncio.Semaphore) -> list[dict]:
+    user_email = user.get('Email')
+    log.info(f'Обработка ресурсов пользователя: {user_email}')
+    token = await token_cache().get_async(user_email, TOKEN_TYPE_EMAIL)
+    return await get_user_shared_resources(user_email, token, client, settings_slots)
+
+
+async def main(users: List[Dict], workers: int = 10, rps: float = 20):
     log.info('Загрузка пользователей...')
 
     log.info(f'Загрузка пользователей завершена. Загружено {len(users)} пользователей.')
+    token_errors = await token_cache().prefetch([user.get('Email') for user in users if user.get('ID')[:3] == '113'], TOKEN_TYPE_EMAIL)
+    log.info(f'Получены токены пользователей. Ошибок: {len(token_errors)}')
     processed = 0
-    with tqdm(total=len(users), unit="User") as progress:
-        for user in users:
-            if user.get('ID')[:3] == '113':
-                user_email = user.get('Email')
-                log.info(f'Обработка ресурсов пользователя: {user_email}')
+    settings_slots = asyncio.Semaphore(workers * 2)
+    # Users are processed in a sliding window, report is written in users order
+    window: deque[tuple[Dict, asyncio.Task]] = deque()
+    async with AsyncDiskClient(
+        rate_controller=AdaptiveRateController(TokenBucket(rps), max_rate=rps),
+        max_in_flight=workers
+    ) as client:
+        with tqdm(total=len(users), unit="User") as progress, \
+                open('disk_report.csv', 'a', newline='', encoding='utf-8') as f:
+            w = csv.DictWriter(f, REPORT_FIELDS)
+
+            async def write_next():
+                nonlocal processed
+                user, task = window.popleft()
                 try:
-                    token = get_service_app_token(user_email)
-                    get_user_shared_resources(user_email, token, client)
+                    w.writerows(await task)
                     processed += 1
-                
                 except Exception as e:
-                    log.error(f'Ошибка при обработке ресурсов пользователя: {user_email}')
+                    log.error(f'Ошибка при обработке ресурсов пользователя: {user.get("Email")}')
                     log.error(e)
-                    #raise e
-            else:
-                log.warning(f'Пропуск пользователя: {user_email}')
-            progress.update(1)
-    client.close()
+                progress.update(1)
+
+            for user in users:
+                if user.get('ID')[:3] == '113':
+                    window.append((user, asyncio.create_task(process_user(user, client, settings_slots))))
+                    if len(window) >= workers * 2:
+                        await write_next()
+                else:
+                    log.warning(f'Пропуск пользователя: {user.get("Email")}')
+                    progress.update(1)
+            while window:
+                await write_next()
     return processed, users
 
 
@@ -143,16 +197,10 @@ if __name__ == '__main__':
     start_time = time()
 
     with open('disk_report.csv', 'w', newline='', encoding='utf-8') as f:
-        w = csv.DictWriter(f, ['email',
-                               'path',
-                               'access_type',
-                               'rights',
-                               'user_id',
-                               'external_user'
-                               ])
+        w = csv.DictWriter(f, REPORT_FIELDS)
         w.writeheader()    
 
-    processed, users = main(users=users)
+    processed, users = asyncio.run(main(users=users, workers=args.workers, rps=args.rps))
     
     end_time = time()
     log.info(f'Завершено. Обработано пользователей: {processed} из {len(users)} за {end_time - start_time} секунд.')
@@ -1,8 +1,13 @@
+import argparse
 import asyncio
+import csv
 import logging
-import os
 import sys
+from argparse import ArgumentParser
+from textwrap import dedent
+from datetime import datetime
 from time import time
+from typing import AsyncIterator
 
 import yadisk
 from dotenv import load_dotenv
@@ -11,14 +16,29 @@ import psutil
 from pathlib import Path
 
 
-from lib.api360 import API360
+from lib.dedupstore import DedupStore
+from lib.disk360 import DiskClientException
+from lib.diskarchive import DiskArchive, zstd_available
+from lib.diskcrawl import DiskCrawler
+from lib.diskmanifest import DiskManifest
+from lib.disktransfer import RangeDownloader
+from lib.sizequeue import SizeAwareQueue
+from lib.throttle import AdaptiveConcurrencyLimiter, AdaptiveRateController, TokenBucket
+from lib.tokens import TOKEN_TYPE_EMAIL
+from tools import read_users_csv, token_cache
 
 load_dotenv()
 
 process = psutil.Process()
 
+LIST_WORKERS = 10
+LIST_RPS = 10
+QUEUE_SIZE = 1000
+PROGRESS_INTERVAL = 10
+# Files up to this size are downloaded in parallel into memory before they are written to an archive
+ARCHIVE_BUFFER_SIZE = 8 * 1024 ** 2
 
-directories: list[ResourceObject] = []
+REPORT_FIELDS = ['email', 'status', 'found', 'downloaded', 'skipped', 'failed', 'removed', 'bytes_downloaded', 'deduplicated', 'bytes_saved', 'minutes', 'error']
 
 log = logging.getLogger('Downloader')
 log.setLevel(logging.DEBUG)
@@ -26,137 +46,450 @@ log_handler = logging.StreamHandler(sys.stdout)
 log_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(message)s'))
 log.addHandler(log_handler)
 
-sem = asyncio.Semaphore(10)
 
+def arg_parser() -> ArgumentParser:
+    parser = ArgumentParser(
+        description=dedent("""
+        Script downloads all user files from Yandex Disk into <email>/ directory
+        Parameters:
+        --email <email> - download files of one user.
+        --users <file.csv> - download files of all users from the file in listusers.py format.
+            Status of every user is written to downloader_report.csv.
+        --listing <flat|tree> - flat: list all files with one flat paginated listing,
+            tree: list every directory. Flat listing falls back to tree on errors. Default: flat.
+        --prune - delete local copies of files removed from the disk since the previous run.
+        --segments <N> - parallel ranges of files larger than 512 MB. Default: 4.
+        --workers <N> - cap of simultaneous downloads of one user. Default: no cap, --max-downloads.
+        --large-slots <N> - workers of one user that start files of --large-size MB and larger first,
+            largest first. Other workers take small files first. Defaults: workers / 4, 64 MB.
+        --parallel-users <N> - users downloaded at the same time. Default: 4.
+        --min-downloads <N>, --max-downloads <N> - bounds of simultaneous downloads of all users. Defaults: 2, 40.
+            The limit grows while throughput rises and is cut on throttling and timeouts.
+        --dedup <directory> - content store shared by all users and runs. Files with md5/sha256 already
+            downloaded are linked from the store instead of downloading. Keep it on the same filesystem.
+        --link <reflink|hardlink> - how files are linked from the store. reflink falls back to hardlink. Default: reflink.
+        --archive <tar|zip> - write files into <email>-<date>.tar or .zip with <archive>.index.csv instead of <email>/.
+            Next runs write archives of new and changed files only, recorded in <email>.<tar|zip>.manifest.db.
+        --full - export all files, not only new and changed ones, e.g. to write a complete archive.
+        --compression <gz|zst|deflate> - gz or zst (zstandard package) for tar, deflate for zip.
+
+        Files are downloaded to <file>.part and continued with HTTP Range after errors and restarts.
+        Downloaded files are recorded in <email>.manifest.db, next runs download only new and changed files
+        and continue an interrupted run.
+        """),
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--email', type=str, help='User email')
+    source.add_argument('--users', type=str, help='CSV file with users')
+    parser.add_argument('--listing', choices=['flat', 'tree'], default='flat', help='Files listing mode')
+    parser.add_argument('--prune', action='store_true', help='Delete local copies of removed files')
+    parser.add_argument('--segments', type=int, default=4, help='Parallel ranges of large files')
+    parser.add_argument('--workers', type=int, help='Cap of simultaneous downloads of one user')
+    parser.add_argument('--large-slots', type=int, help='Workers of one user preferring large files')
+    parser.add_argument('--large-size', type=int, default=64, help='Size of large files in MB')
+    parser.add_argument('--parallel-users', type=int, default=4, help='Users downloaded at the same time')
+    parser.add_argument('--min-downloads', type=int, default=2, help='Lowest limit of simultaneous downloads of all users')
+    parser.add_argument('--max-downloads', type=int, default=40, help='Highest limit of simultaneous downloads of all users')
+    parser.add_argument('--dedup', type=str, help='Content store directory')
+    parser.add_argument('--link', choices=['reflink', 'hardlink'], default='reflink', help='Link mode of content store')
+    parser.add_argument('--archive', choices=['tar', 'zip'], help='Write files into archive')
+    parser.add_argument('--compression', choices=['gz', 'zst', 'deflate'], help='Archive compression')
+    parser.add_argument('--full', action='store_true', help='Export all files, not only new and changed')
+    return parser
+
+
+class DownloadStats:
+    def __init__(self, email: str):
+        self.email = email
+        self.status = 'pending'
+        self.found = 0
+        self.downloaded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.removed = 0
+        self.bytes_total = 0
+        self.bytes_downloaded = 0
+        self.deduplicated = 0
+        self.bytes_saved = 0
+        self.listing_errors = 0
+        self.minutes = 0.0
+        self.error = ''
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in REPORT_FIELDS}
+
+
+class UserExport:
+    """Download files of one user: listing feeds a bounded queue drained by a pool of download workers.
+    Files are saved into <email>/ or written into archive. Large files are started largest first
+    by workers with large slots, small files fill the other workers.
+
+    Args:
+        email (str): User email, files are saved into <email>/
+        client (yadisk.AsyncClient): Disk client with user token
+        transfer (RangeDownloader): Downloader shared by all users
+        limiter (AdaptiveConcurrencyLimiter): Adaptive downloads limit shared by all users
+        listing (str, optional): 'flat' or 'tree' listing. Defaults to 'flat'.
+        workers (int, optional): Download workers of this user, every download also waits for a slot of limiter. Defaults to 10.
+        large_slots (int, optional): Workers preferring large files. Defaults to workers / 4.
+        large_size (int, optional): Size of large files in bytes. Defaults to 64 MB.
+        prune (bool, optional): Delete local copies of files removed from disk. Defaults to False.
+        dedup (DedupStore, optional): Content store to link files with known content from. Defaults to None.
+        archive (DiskArchive, optional): Archive to write files into instead of <email>/. Archive exports
+            have their own manifest <email>.<tar|zip>.manifest.db. Defaults to None.
+        full (bool, optional): Export all files, not only new and changed. Defaults to False.
+    """
+
+    def __init__(
+            self,
+            email: str,
+            client: yadisk.AsyncClient,
+            transfer: RangeDownloader,
+            limiter: AdaptiveConcurrencyLimiter,
+            listing: str = 'flat',
+            workers: int = 10,
+            large_slots: int = None,
+            large_size: int = 64 * 1024 ** 2,
+            prune: bool = False,
+            dedup: DedupStore = None,
+            archive: DiskArchive = None,
+            full: bool = False
+    ):
+        self.__email = email
+        self.__client = client
+        self.__transfer = transfer
+        self.__limiter = limiter
+        self.__listing = listing
+        self.__workers = workers
+        self.__large_slots = max(1, workers // 4) if large_slots is None else min(large_slots, workers)
+        self.__large_size = large_size
+        self.__prune = prune
+        self.__dedup = dedup
+        self.__archive = archive
+        self.__full = full
+        self.__stats = DownloadStats(email)
+
+    @property
+    def stats(self) -> DownloadStats:
+        return self.__stats
+
+    async def run(self) -> DownloadStats:
+        queue: SizeAwareQueue[ResourceObject] = SizeAwareQueue(self.__large_size, QUEUE_SIZE)
+        self.__listed = False
+        self.__started = time()
+        manifest_path = f'{self.__email}.{self.__archive.format}.manifest.db' if self.__archive else f'{self.__email}.manifest.db'
+        with DiskManifest(manifest_path) as manifest:
+            workers = [
+                asyncio.create_task(self.__download_worker(queue, manifest, large_slot=i < self.__large_slots))
+                for i in range(self.__workers)
+            ]
+            progress = asyncio.create_task(self.__report_progress())
+            try:
+                await self.__enqueue_files(queue, manifest)
+                self.__listed = True
+                await queue.close()
+                await asyncio.gather(*workers)
+            finally:
+                for task in workers + [progress]:
+                    task.cancel()
+                await asyncio.gather(*workers, progress, return_exceptions=True)
+                if self.__archive:
+                    await self.__archive.close()
+                    manifest.confirm_pending()
+                    log.info(f'{self.__email}: archive: {self.__archive.path}')
+
+            if self.__stats.listing_errors:
+                log.warning(f'{self.__email}: listing is incomplete, removed files are not checked')
+            else:
+                removed = manifest.complete()
+                self.__stats.removed = len(removed)
+                log.info(f'{self.__email}: files removed from disk since previous run: {len(removed)}')
+                for path in removed:
+                    log.debug(f'{self.__email}: removed from disk: {path}')
+                    if self.__prune and not self.__archive:
+                        Path(f'{self.__email}{path}').unlink(missing_ok=True)
+        return self.__stats
+
+    async def __download_file(self, file: ResourceObject) -> bool:
+        """Stream a file to <path>.part and rename it when complete. Partial file of the same
+        version left by a failed or interrupted run is continued.
+        Returns True if the file was linked from the dedup store instead"""
+        path = file.path.removeprefix('disk:')
+        target = f'{self.__email}{path}'
+
+        async def download():
+            async with self.__limiter:
+                await self.__transfer.download(
+                    lambda: self.__client.get_download_link(path),
+                    target,
+                    size=file.size,
+                    version=file.md5 or file.sha256
+                )
 
-async def main(email: str):
-    start_time = time()
-
-    response = {}
-    try:
-        response = API360.get_service_app_token(
-            client_id=os.getenv('CLIENT_ID'),
-            client_secret=os.getenv('CLIENT_SECRET'),
-            subject_token=email,
-            subject_token_type='urn:yandex:params:oauth:token-type:email'
-        )
-        if 'error' in response:
-            raise Exception(f'{response["error"]}: {response["error_description"]}')
-            exit(1)
-
-    except Exception as e:
-        log.debug(f'Failed to get service app token: {e}')
-        exit(1)
-    token = response['access_token']
-    # print(token)
-    client = yadisk.AsyncClient(token=token)
-
-    async with client:
-
-        if await client.check_token():
-            log.info('Test service app token: Success')
+        if self.__dedup is None:
+            await download()
+            return False
+        linked = await self.__dedup.fetch(file, target, download)
+        if linked:
+            self.__stats.deduplicated += 1
+            self.__stats.bytes_saved += file.size or 0
+            self.__stats.bytes_total -= file.size or 0
+        return linked
+
+    async def __archive_file(self, file: ResourceObject):
+        """Write a file into archive. Small files are downloaded into memory in parallel,
+        large files are streamed into archive one at a time"""
+        path = file.path.removeprefix('disk:')
+
+        def chunks():
+            return self.__transfer.iter_chunks(lambda: self.__client.get_download_link(path), file.size)
+
+        if (file.size or 0) <= ARCHIVE_BUFFER_SIZE:
+            async with self.__limiter:
+                data = b''.join([chunk async for chunk in chunks()])
+            await self.__archive.add_bytes(file, data)
         else:
-            log.error('Test service app token: Failed')
-            exit(1)
-
-        disk_info: DiskInfoObject = await client.get_disk_info()
-
-        log.info(f'Starting files download for user: {email}')
-        log.info(f'Used disk space: {round(disk_info.used_space / 1024 ** 2, 2)} MB')
-
-        log.info('Listing user directories...')
-
-        await list_directory(client, '/')
-
-        log.debug(f'Used memory {round(process.memory_info().rss / 1024 ** 2, 2)} MB')
+            async with self.__archive.entry(file) as write:
+                async with self.__limiter:
+                    async for chunk in chunks():
+                        await write(chunk)
+
+    def __progress(self) -> str:
+        stats = self.__stats
+        to_download = stats.found - stats.skipped
+        progress = (f'files {stats.downloaded + stats.deduplicated + stats.failed}/{to_download}, '
+                    f'{round(stats.bytes_downloaded / 1024 ** 2, 2)}/{round(stats.bytes_total / 1024 ** 2, 2)} MB')
+        elapsed = time() - self.__started
+        if self.__listed and stats.bytes_downloaded and elapsed:
+            eta = (stats.bytes_total - stats.bytes_downloaded) / (stats.bytes_downloaded / elapsed)
+            progress += f', ETA {round(eta / 60, 1)} min'
+        return progress + f', downloads limit {self.__limiter.limit}'
+
+    async def __report_progress(self):
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            log.info(f'{self.__email}: progress: {self.__progress()}')
+
+    async def __download_worker(self, queue: SizeAwareQueue, manifest: DiskManifest, large_slot: bool = False):
+        """Download files from the queue until it is closed and empty"""
+        stats = self.__stats
+        while (file := await queue.get(large_slot)) is not None:
+            try:
+                if self.__archive:
+                    await self.__archive_file(file)
+                    manifest.mark_downloaded(file, pending=True)
+                else:
+                    linked = await self.__download_file(file)
+                    manifest.mark_downloaded(file)
+                    if linked:
+                        log.info(f'{self.__email}: linked {file.path.removeprefix("disk:")} ({self.__progress()})')
+                        continue
+                stats.downloaded += 1
+                stats.bytes_downloaded += file.size or 0
+                log.info(f'{self.__email}: downloaded {file.path.removeprefix("disk:")} ({self.__progress()})')
+            except Exception as e:
+                if isinstance(e, yadisk.exceptions.TooManyRequestsError):
+                    self.__limiter.on_throttled()
+                stats.failed += 1
+                stats.bytes_total -= file.size or 0
+                log.error(f'{self.__email}: failed to download file {file.path}: {e}')
+
+    def __new_crawler(self) -> DiskCrawler:
+        return DiskCrawler(
+            self.__client,
+            workers=LIST_WORKERS,
+            rate_controller=AdaptiveRateController(TokenBucket(LIST_RPS), max_rate=LIST_RPS * 4)
+        )
 
-        log.info(f'Found directories count: {len(directories)}')
-        log.info('Listing user files...')
-        files = await list_files(client)
+    async def __iter_resources(self) -> AsyncIterator[ResourceObject]:
+        """Iterate over user files, and directories for tree listing. Flat listing falls back
+        to tree listing if it fails before the first file. Directories that failed to list
+        are counted in stats.listing_errors"""
+        if self.__listing == 'flat':
+            crawler = self.__new_crawler()
+            listed = False
+            try:
+                async for item in crawler.flat_files():
+                    listed = True
+                    yield item
+                log.debug(f'{self.__email}: listing requests: {crawler.requests}')
+                return
+            except Exception as e:
+                if listed:
+                    raise
+                log.error(f'{self.__email}: flat files listing failed, listing directories: {e}')
+
+        crawler = self.__new_crawler()
+        async for item in crawler.crawl('/'):
+            yield item
+        log.debug(f'{self.__email}: listing requests: {crawler.requests}')
+        self.__stats.listing_errors = len(crawler.errors)
+        if crawler.errors:
+            log.error(f'{self.__email}: failed to list directories: {len(crawler.errors)}')
+
+    async def __enqueue_files(self, queue: SizeAwareQueue, manifest: DiskManifest):
+        """Create local directories, or archive entries of directories, and put new and changed files
+        to the download queue as they are listed.
+        Waits while the queue is full, so listing runs only slightly ahead of downloads"""
+        stats = self.__stats
+        created: set[str] = set()
+        async for item in self.__iter_resources():
+            path = item.path.removeprefix('disk:')
+            if self.__archive:
+                if item.type == 'dir':
+                    await self.__archive.add_directory(item)
+            else:
+                directory = path if item.type == 'dir' else path.rpartition('/')[0]
+                if directory not in created:
+                    Path(self.__email + directory).mkdir(parents=True, exist_ok=True)
+                    created.add(directory)
+            if item.type != 'dir':
+                stats.found += 1
+                if manifest.check(item) or self.__full or (not self.__archive and not Path(self.__email + path).exists()):
+                    stats.bytes_total += item.size or 0
+                    await queue.put(item, item.size or 0)
+                else:
+                    stats.skipped += 1
+        log.info(f'{self.__email}: found files: {stats.found}, to download: {stats.found - stats.skipped} '
+                 f'({round(stats.bytes_total / 1024 ** 2, 2)} MB)')
         log.debug(f'Used memory {round(process.memory_info().rss / 1024 ** 2, 2)} MB')
-        files_count = len(files)
-        log.info(f'Found files to download: {files_count}')
-        log.info('Downloading user files...')
-
-
 
-        for directory in directories:
-            path = email + directory.path.removeprefix('disk:')
-            log.debug(f'Creating directory: {path}')
-            Path(path).mkdir(parents=True, exist_ok=True)
 
-        file_position = 1
-        tasks = []
-        for file in files:
-
-            # log.debug(directory.path)
-            file_position_str = f'[{file_position}/{files_count}]'
-            file_position += 1
-
-            tasks.append(asyncio.create_task(
-                    safe_download(
-                        client=client,
-                        path=file.path.removeprefix('disk:'),
-                        email=email,
-                        file_position_of=file_position_str
-                    )
-                )
+async def export_user(
+        email: str,
+        transfer: RangeDownloader,
+        limiter: AdaptiveConcurrencyLimiter,
+        archive_format: str = None,
+        compression: str = None,
+        **options
+) -> DownloadStats:
+    start_time = time()
+    stats = DownloadStats(email)
+    try:
+        token = await token_cache().get_async(email, TOKEN_TYPE_EMAIL)
+        async with yadisk.AsyncClient(token=token) as client:
+            if not await client.check_token():
+                raise DiskClientException('Service app token check failed')
+
+            disk_info: DiskInfoObject = await client.get_disk_info()
+            log.info(f'Starting files download for user: {email}')
+            log.info(f'{email}: used disk space: {round(disk_info.used_space / 1024 ** 2, 2)} MB')
+
+            archive = None
+            if archive_format:
+                archive = DiskArchive(f'{email}-{datetime.now():%Y%m%d-%H%M%S}', archive_format, compression)
+            export = UserExport(email, client, transfer, limiter, archive=archive, **options)
+            stats = export.stats
+            await export.run()
+            stats.status = 'done' if not stats.failed and not stats.listing_errors else 'incomplete'
+    except Exception as e:
+        log.error(f'{email}: export failed: {e}')
+        stats.status = 'error'
+        stats.error = str(e)
+    stats.minutes = round((time() - start_time) / 60, 2)
+    log.info(f'{email}: {stats.status}. Downloaded {stats.downloaded} of {stats.found} files '
+             f'({round(stats.bytes_downloaded / 1024 ** 2, 2)} MB) in {stats.minutes} minutes, '
+             f'unchanged: {stats.skipped}, failed: {stats.failed}, '
+             f'deduplicated: {stats.deduplicated} ({round(stats.bytes_saved / 1024 ** 2, 2)} MB saved)')
+    return stats
+
+
+async def main(
+        emails: list[str],
+        listing: str = 'flat',
+        prune: bool = False,
+        segments: int = 4,
+        workers: int = None,
+        large_slots: int = None,
+        large_size: int = 64,
+        parallel_users: int = 4,
+        min_downloads: int = 2,
+        max_downloads: int = 40,
+        dedup: str = None,
+        link: str = 'reflink',
+        archive: str = None,
+        compression: str = None,
+        full: bool = False
+) -> list[DownloadStats]:
+    """Download files of users, parallel_users at a time. Downloads of all users share an adaptive
+    limit between min_downloads and max_downloads, every user has max_downloads download workers,
+    or workers if it is lower, so the adaptive limit is the bound of downloads. With dedup every content is downloaded once
+    into the dedup directory store. With archive files of every user are written into a tar or zip archive"""
+    token_errors = await token_cache().prefetch(emails, TOKEN_TYPE_EMAIL)
+    log.info(f'Got service app tokens of {len(emails) - len(token_errors)} users, errors: {len(token_errors)}')
+
+    dedup_store = DedupStore(dedup, link) if dedup else None
+    user_slots = asyncio.Semaphore(parallel_users)
+    limiter = AdaptiveConcurrencyLimiter(initial=min(10, max_downloads), min_limit=min_downloads, max_limit=max_downloads)
+    user_workers = min(workers, max_downloads) if workers else max_downloads
+
+    async def export(email: str) -> DownloadStats:
+        async with user_slots:
+            return await export_user(
+                email, transfer, limiter, archive_format=archive, compression=compression,
+                listing=listing, workers=user_workers, large_slots=large_slots, large_size=large_size * 1024 ** 2,
+                prune=prune, dedup=dedup_store, full=full
             )
-        await asyncio.gather(*tasks)
-        end_time = time()
-        log.info(f'Downloaded {len(files)} files in {round((end_time - start_time) / 60, 2)} minutes')
-        log.debug(f'Used memory {round(process.memory_info().rss / 1024 ** 2, 2)} MB')
-
-async def download_file(client, path, email, file_position_of):
-    # log.info(f'Downloading file {file_position_of}: {path}')
-    await client.download(path, f'{email}{path}')
-    log.info(f'Downloaded file {file_position_of}: {path}')
-
-
-async def safe_download(*args, **kwargs):
-    async with sem:  # semaphore limits num of simultaneous downloads
-        return await download_file(*args, **kwargs)
-
-async def process_directories(client, directories_list):
-    if len(directories_list) > 0:
-        # log.debug(f'Starting to process {len(directories_list)} directories')
-
-        for directory in directories_list:
-            # log.debug(f'Process directory: {directory.path}')
-            # log.debug('PD: Waiting to keep rps')
-            await asyncio.sleep(0.1)
-            # log.debug('PD: Done waiting sleep')
-            await list_directory(client, directory.path)
-            # log.debug('PD: Done process dir')
-
-
-async def list_directory(client, path):
-    global directories
-    directories_list: list[ResourceObject] = []
-
-    async for item in client.listdir(path):
-        if item.type == 'dir':
-            # log.debug(f'Add directory: {item.path}')
-            directories_list.append(item)
-    directories.extend(directories_list)
-    await process_directories(client, directories_list)
-
-async def list_files(client) -> list[ResourceObject]:
-    files_list: list[ResourceObject] = []
-    async for item in client.listdir('/'):
-        if item.type == 'file':
-            files_list.append(item)
-            # log.debug(f'Add file: {item.path}')
-    for directory in directories:
-        async for item in client.listdir(directory.path):
-            if item.type == 'file':
-                files_list.append(item)
-                # log.debug(f'Add file: {item.path}')
-        await asyncio.sleep(0.1)
-    return files_list
 
+    async with RangeDownloader(max_segments=segments, limiter=limiter) as transfer:
+        results = await asyncio.gather(*(export(email) for email in emails))
+    log.info(f'Downloads limit: {limiter.limit}, throughput: {round(limiter.throughput / 1024 ** 2, 2)} MB/s')
+    if dedup_store:
+        log.info(f'Deduplicated files: {dedup_store.linked}, saved: {round(dedup_store.bytes_saved / 1024 ** 2, 2)} MB')
+    log.debug(f'Used memory {round(process.memory_info().rss / 1024 ** 2, 2)} MB')
+    return results
 
 
 if __name__ == "__main__":
-    user_email = input('Enter user email: ')
-    asyncio.run(main(email=user_email))
\ No newline at end of file
+    parser = arg_parser()
+    args = parser.parse_args()
+    if args.archive and args.dedup:
+        parser.error('--dedup can not be used with --archive')
+    if args.compression and not args.archive:
+        parser.error('--compression requires --archive')
+    if args.compression and (args.archive == 'zip') != (args.compression == 'deflate'):
+        parser.error('Use gz or zst compression with tar, deflate with zip')
+    if args.compression == 'zst' and not zstd_available():
+        parser.error('zst compression requires zstandard package')
+    if args.users:
+        users = read_users_csv(args.users)
+        emails = []
+        for user in users:
+            if user.get('ID')[:3] == '113':
+                emails.append(user.get('Email'))
+            else:
+                log.warning(f'Skip user: {user.get("Email")}')
+    else:
+        emails = [args.email]
+
+    start_time = time()
+    results = asyncio.run(main(
+        emails=emails,
+        listing=args.listing,
+        prune=args.prune,
+        segments=args.segments,
+        workers=args.workers,
+        large_slots=args.large_slots,
+        large_size=args.large_size,
+        parallel_users=args.parallel_users,
+        min_downloads=args.min_downloads,
+        max_downloads=args.max_downloads,
+        dedup=args.dedup,
+        link=args.link,
+        archive=args.archive,
+        compression=args.compression,
+        full=args.full
+    ))
+
+    with open('downloader_report.csv', 'w', newline='', encoding='utf-8') as f:
+        w = csv.DictWriter(f, REPORT_FIELDS)
+        w.writeheader()
+        w.writerows(stats.to_dict() for stats in results)
+
+    done = sum(1 for stats in results if stats.status == 'done')
+    log.info(f'Finished {done} of {len(results)} users in {round((time() - start_time) / 60, 2)} minutes')
+    for stats in results:
+        if stats.status != 'done':
+            log.info(f'{stats.email}: {stats.status} {stats.error}')
+    log.info('Report: downloader_report.csv')
@@ -10,7 +10,7 @@ from typing import List, Dict
 import yadisk
 from dotenv import load_dotenv
 
-from tools import get_service_app_token
+from tools import get_service_app_token, prefetch_service_app_tokens
 
 load_dotenv()
 
@@ -80,6 +80,7 @@ def deleter(users: List[Dict], permanent: bool = False):
         print('Данные будут удалены безвозвратно')
     confirm = input('Вы уверены что хотите удалить данные? (y/n) ')
     if confirm == 'y':
+        prefetch_service_app_tokens([user.get('Email') for user in users])
         for user in users:
             user_email = user.get('Email')
             log.debug(f"*** Старт удаления данных для: {user_email}")
@@ -97,6 +98,7 @@ def disk_info(users: List[Dict]):
     with open('disk_info.csv', 'w', newline='', encoding='utf-8') as f:
         w = csv.DictWriter(f, ['ID' , 'Email', 'Size MB'])
         w.writeheader()
+        prefetch_service_app_tokens([user.get('Email') for user in users])
         for user in users:
             user_email = user.get('Email')
             log.debug(f"*** Получение информации о диске для: {user_email}")
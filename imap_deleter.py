@@ -1,7 +1,6 @@
 import argparse
 import csv
 import logging
-import os
 import sys
 from argparse import ArgumentParser
 from logging import Logger
@@ -12,7 +11,8 @@ from imapclient import IMAPClient
 
 from dotenv import load_dotenv
 
-from lib.api360 import API360
+from lib.tokens import TOKEN_TYPE_UID
+from tools import prefetch_service_app_tokens, token_cache
 
 load_dotenv()
 
@@ -95,19 +95,11 @@ def split_list_into_chunks(lst, chunk_size):
 
 
 def get_service_token(user_id: str) -> str:
-    response = {}
-
     try:
-        response = API360.get_service_app_token(
-            client_id=os.getenv('CLIENT_ID'),
-            client_secret=os.getenv('CLIENT_SECRET'),
-            subject_token=user_id,
-            subject_token_type='urn:yandex:params:oauth:token-type:uid'
-        )
+        return token_cache().get(user_id, TOKEN_TYPE_UID)
     except Exception as e:
         log.debug(f'Failed to get service app token: {e}')
         exit(1)
-    return response['access_token']
 
 
 def main():
@@ -119,6 +111,7 @@ def main():
     confirm = input('Вы уверены что хотите УДАЛИТЬ письма? (y/n)')
 
     if confirm == 'y':
+        prefetch_service_app_tokens([user.get('ID') for user in users], TOKEN_TYPE_UID)
         for user in users:
             log.debug(f"*** Старт удаления писем для: {user.get('Email')}")
             token = get_service_token(user_id=user.get('ID'))
@@ -15,7 +15,8 @@ from imapclient import IMAPClient
 
 from dotenv import load_dotenv
 
-from lib.api360 import API360
+from lib.tokens import TOKEN_TYPE_UID
+from tools import token_cache
 
 load_dotenv()
 
@@ -107,19 +108,11 @@ async def download_user_mail(token: str, email: str):
     return ttl_emails
 
 async def get_service_token(user_id: str) -> str:
-    response = {}
-
     try:
-        response = await API360.get_service_app_token_async(
-            client_id=os.getenv('CLIENT_ID'),
-            client_secret=os.getenv('CLIENT_SECRET'),
-            subject_token=user_id,
-            subject_token_type='urn:yandex:params:oauth:token-type:uid'
-        )
+        return await token_cache().get_async(user_id, TOKEN_TYPE_UID)
     except Exception as e:
         log.debug(f'Failed to get service app token: {e}')
         exit(1)
-    return response['access_token']
 
 
 async def main():
@@ -131,6 +124,7 @@ async def main():
     confirm = input('Вы уверены что хотите загрузить письма? (y/n)')
 
     if confirm == 'y':
+        await token_cache().prefetch([user.get('ID') for user in users], TOKEN_TYPE_UID)
         for user in users:
             log.debug(f"*** Старт загрузки писем для: {user.get('Email')}")
             token = await get_service_token(user_id=user.get('ID'))
@@ -1,23 +1,47 @@
 import asyncio
+import atexit
 import logging
 import sys
-from time import sleep
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import AsyncIterator
 
 import aiohttp
 import httpx
 
-from lib.types import GroupMemberType, GroupMembers2, GroupsPage, User, UsersPage
+from lib.jsonutil import loads
+from lib.throttle import DEFAULT_RETRY_POLICY, AdaptiveRateController, RetryPolicy, TokenBucket
+from lib.types import Group, GroupMemberType, GroupMembers2, GroupsPage, User, UsersPage
+
+
+class API360Exception(Exception):
+    def __init__(self, message: str, status: int = None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
 
 
 class API360:
-    __url = 'https://api360.yandex.net/directory/v1/org/'
-    __url_v2 = 'https://api360.yandex.net/directory/v2/org/'
-    __fetch_rate = 0.1
     __per_page = 100
 
-    def __init__(self, api_key: str, org_id: str, log_level=logging.INFO):
+    def __init__(
+            self,
+            api_key: str,
+            org_id: str,
+            log_level=logging.INFO,
+            connection_limit: int = 100,
+            keepalive_timeout: float = 30,
+            base_url: str = 'https://api360.yandex.net',
+            requests_per_second: float = 20,
+            max_requests_per_second: float = 100,
+            max_in_flight: int = 10,
+            retry_policy: RetryPolicy = DEFAULT_RETRY_POLICY
+    ):
         self._api_key = api_key
         self._org_id = org_id
+        self._url = f'{base_url}/directory/v1/org/'
+        self._url_v2 = f'{base_url}/directory/v2/org/'
         self._logger = logging.getLogger('api360')
         self._logger.setLevel(log_level)
         log_handler = logging.StreamHandler(sys.stdout)
@@ -28,61 +52,232 @@ class API360:
             "Authorization": f"OAuth {api_key}",
             "content-type": "application/json",
         }
-    '''
-    def _send_request(self, path) -> Response:
-        response = get(path, headers=self._headers)
-        if response.status_code == 200:
-            return response
-        else:
-            raise Exception(f"Request failed with status {response.status_code}")
-    '''
+
+        self._connection_limit = connection_limit
+        self._keepalive_timeout = keepalive_timeout
+        self._sessions: dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+        self._facade_loop: asyncio.AbstractEventLoop | None = None
+        self._facade_thread: threading.Thread | None = None
+        self._facade_lock = threading.Lock()
+
+        self._rate_controller = AdaptiveRateController(
+            TokenBucket(requests_per_second),
+            max_rate=max_requests_per_second
+        )
+        self._max_in_flight = max_in_flight
+        self._retry_policy = retry_policy
+
+    async def __aenter__(self):
+        await self._get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Get pooled session bound to the running event loop. Session is created on first use
+        and reused by all requests, so connections are kept alive between calls.
+
+        Returns:
+            aiohttp.ClientSession: Shared session
+        """
+
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            # Sessions of finished asyncio.run() loops can not be used or closed anymore
+            for stale_loop in [stale_loop for stale_loop in self._sessions if stale_loop.is_closed()]:
+                del self._sessions[stale_loop]
+            connector = aiohttp.TCPConnector(
+                limit=self._connection_limit,
+                keepalive_timeout=self._keepalive_timeout
+            )
+            session = aiohttp.ClientSession(connector=connector)
+            self._sessions[loop] = session
+        return session
+
+    async def close(self):
+        """Close pooled session of the running event loop and all its connections"""
+
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
+
+    def _run(self, coro):
+        """Run coroutine from synchronous code on a long-lived event loop in a background thread.
+        All synchronous calls share this loop and its pooled session, calls from several threads run concurrently.
+        """
+
+        with self._facade_lock:
+            if self._facade_loop is None:
+                self._facade_loop = asyncio.new_event_loop()
+                self._facade_thread = threading.Thread(
+                    target=self._facade_loop.run_forever,
+                    name='api360-loop',
+                    daemon=True
+                )
+                self._facade_thread.start()
+                atexit.register(self.shutdown)
+        if threading.current_thread() is self._facade_thread:
+            raise RuntimeError('Synchronous API360 methods can not be called from coroutines on its own loop')
+        return asyncio.run_coroutine_threadsafe(coro, self._facade_loop).result()
+
+    def submit(self, coro) -> Future:
+        """Schedule coroutine on the synchronous facade loop without waiting for result.
+        Lets synchronous code run many API calls concurrently over the shared connection pool.
+        """
+
+        self._run(asyncio.sleep(0))
+        return asyncio.run_coroutine_threadsafe(coro, self._facade_loop)
+
+    def shutdown(self):
+        """Close session of the synchronous facade and stop its event loop"""
+
+        with self._facade_lock:
+            loop, thread = self._facade_loop, self._facade_thread
+            self._facade_loop = None
+            self._facade_thread = None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+        atexit.unregister(self.shutdown)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    async def _request(self, path, method='get', body=None) -> dict:
+        return await self._send_request(
+            path,
+            self._headers,
+            method=method,
+            body=body,
+            session=await self._get_session(),
+            retry_policy=self._retry_policy,
+            rate_controller=self._rate_controller
+        )
+
     @staticmethod
-    async def _send_request(path, headers, method='get', body = None, data = None) -> dict:
-        async with aiohttp.ClientSession() as session:
-            if method == 'get':
-                async with session.get(url=path, headers=headers) as response:
+    async def _send_request(
+            path,
+            headers,
+            method='get',
+            body = None,
+            data = None,
+            session: aiohttp.ClientSession = None,
+            retry_policy: RetryPolicy = DEFAULT_RETRY_POLICY,
+            rate_controller: AdaptiveRateController = None
+    ) -> dict:
+        """Send request and decode JSON response. Throttled (429), failed (5xx) and reset requests
+        are retried according to retry_policy.
+
+        Raises:
+            API360Exception: Response status is not 200 and retries are exhausted
+        """
+
+        if session is None:
+            async with aiohttp.ClientSession() as session:
+                return await API360._send_request(path, headers, method, body, data, session, retry_policy, rate_controller)
+
+        attempt = 0
+        while True:
+            if rate_controller:
+                await rate_controller.acquire()
+            retry_after = None
+            try:
+                async with session.request(method, url=path, headers=headers, json=body, data=data) as response:
                     if response.status == 200:
-                        return await response.json()
-                    else:
-                        raise Exception(f"Request failed with status {response.status} - {response} - {response.content}")
-            else:
-                if body:
-                    async with session.post(url=path, headers=headers, json=body) as response:
-                        if response.status == 200:
-                            return await response.json()
-                        else:
-                            raise Exception(f"Request failed with status {response.status} - {response}")
-                elif data:
-                    async with session.post(url=path, headers=headers, data=data) as response:
-                        if response.status == 200:
-                            return await response.json()
-                        else:
-                            raise Exception(f"Request failed with status {response.status} - {response}")
+                        if rate_controller:
+                            rate_controller.on_success()
+                        return loads(await response.read())
+                    if response.status == 429 and rate_controller:
+                        rate_controller.on_throttled()
+                    retry_after = response.headers.get('Retry-After')
+                    error = API360Exception(
+                        f"Request failed with status {response.status} - {response.method} {response.url} - {await response.text()}",
+                        response.status
+                    )
+                    if not retry_policy.is_retryable_status(response.status):
+                        raise error
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = e
+
+            if not retry_policy.can_retry(attempt):
+                raise error
+            delay = retry_policy.delay(attempt, retry_after)
+            logging.getLogger('api360').debug(f"Retry {attempt + 1} in {delay:.2f}s: {error}")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def get_user_async(self, user_id) -> User:
+        path = f'{self._url}{self._org_id}/users/{user_id}'
+        response_json = await self._request(path)
+        return User.from_dict(response_json)
 
     def get_user(self, user_id) -> User:
-        path = f'{self.__url}{self._org_id}/users/{user_id}'
-        response_json = asyncio.run(self._send_request(path, self._headers))
-        return User.from_dict(response_json)
+        return self._run(self.get_user_async(user_id))
 
 
     async def count_pages(self)-> tuple[int, int]:
         """Get number of pages in users list response"""
 
         self._logger.debug(f"Counting users pages for organization: {self._org_id}")
-        path = f'{self.__url}{self._org_id}/users?perPage={self.__per_page}'
+        path = f'{self._url}{self._org_id}/users?perPage={self.__per_page}'
 
-        # response_json = asyncio.run(self._send_request(path, self._headers))
-        response_json = await self._send_request(path, self._headers)
+        response_json = await self._request(path)
         self._logger.debug(f"Users response: {response_json}")
         pages_count = response_json['pages']
         users_count = response_json['total']
         return users_count, pages_count
 
     async def get_users_page(self, page) -> UsersPage:
-        path = f'{self.__url}{self._org_id}/users?page={page}&perPage={self.__per_page}'
-        response_json = await self._send_request(path, self._headers)
+        path = f'{self._url}{self._org_id}/users?page={page}&perPage={self.__per_page}'
+        response_json = await self._request(path)
         return UsersPage.from_dict(response_json)
-    
+
+    async def iter_users(self) -> AsyncIterator[User]:
+        """Iterate over all users of an organization. Up to max_in_flight pages are fetched ahead,
+        users are yielded in page order as soon as their page arrives.
+
+        Yields:
+            User: Organization user
+        """
+
+        first_page = await self.get_users_page(1)
+        total_pages = first_page.pages
+        for user in first_page.users:
+            yield user
+        del first_page
+
+        pending: deque[asyncio.Future] = deque()
+        next_page = 2
+        try:
+            while next_page <= total_pages or pending:
+                while next_page <= total_pages and len(pending) < self._max_in_flight:
+                    pending.append(asyncio.ensure_future(self.get_users_page(next_page)))
+                    next_page += 1
+                users_page = await pending.popleft()
+                self._logger.debug(f"Fetched users page: {users_page.page}")
+                for user in users_page.users:
+                    yield user
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def get_all_users_async(self) -> list[User]:
+        """Get all users of an organization. Pages are fetched concurrently through one pooled session.
+
+        Returns:
+            list[User]: List of users
+        """
+
+        return [user async for user in self.iter_users()]
+
     def get_all_users(self) -> list[User]:
         """Get all users of an organization.
 
@@ -90,15 +285,9 @@ class API360:
             list[User]: List of users
         """
 
-        users = []
-        _, total_pages = asyncio.run(self.count_pages())
-        for page in range(1, total_pages + 1):
-            users_page = asyncio.run(self.get_users_page(page))
-            users.extend(users_page.users)
-            sleep(self.__fetch_rate)
-        return users
-    
-    def add_user_to_group(self, user_id: str, group_id: int) -> dict:
+        return self._run(self.get_all_users_async())
+
+    async def add_user_to_group_async(self, user_id: str, group_id: int) -> dict:
         """Add user to group. Use API v1 method: dev/api360/doc/ru/ref/GroupService/GroupService_AddMember
 
         Args:
@@ -109,16 +298,57 @@ class API360:
             dict: Response
         """
 
-        path = f'{self.__url}{self._org_id}/groups/{group_id}/members'
+        path = f'{self._url}{self._org_id}/groups/{group_id}/members'
         body = {
             "id": user_id,
             "type": GroupMemberType.USER.value
         }
 
-        response_json = asyncio.run(self._send_request(path, self._headers, method='post', body=body))
+        response_json = await self._request(path, method='post', body=body)
         return response_json
 
-    def get_groups(self, page: int = 1, per_page: int = 10) -> GroupsPage:
+    def add_user_to_group(self, user_id: str, group_id: int) -> dict:
+        """Add user to group. Use API v1 method: dev/api360/doc/ru/ref/GroupService/GroupService_AddMember
+
+        Args:
+            user_id (str): User ID
+            group_id (int): Group ID
+
+        Returns:
+            dict: Response
+        """
+
+        return self._run(self.add_user_to_group_async(user_id, group_id))
+
+    async def remove_user_from_group_async(self, user_id: str, group_id: int) -> dict:
+        """Remove user from group. Use API v1 method: https://yandex.ru/dev/api360/doc/ru/ref/GroupService/GroupService_DeleteMember
+
+        Args:
+            user_id (str): User ID
+            group_id (int): Group ID
+
+        Returns:
+            dict: Response
+        """
+
+        path = f'{self._url}{self._org_id}/groups/{group_id}/members/{GroupMemberType.USER.value}/{user_id}'
+        response_json = await self._request(path, method='delete')
+        return response_json
+
+    def remove_user_from_group(self, user_id: str, group_id: int) -> dict:
+        """Remove user from group. Use API v1 method: https://yandex.ru/dev/api360/doc/ru/ref/GroupService/GroupService_DeleteMember
+
+        Args:
+            user_id (str): User ID
+            group_id (int): Group ID
+
+        Returns:
+            dict: Response
+        """
+
+        return self._run(self.remove_user_from_group_async(user_id, group_id))
+
+    async def get_groups_async(self, page: int = 1, per_page: int = 10) -> GroupsPage:
         """Get groups of an organization. Use API v1 method: https://yandex.ru/dev/api360/doc/ru/ref/GroupService/GroupService_List
 
         Args:
@@ -129,12 +359,46 @@ class API360:
             GroupsPage: List of groups
         """
 
-        path = f'{self.__url}{self._org_id}/groups?page={page}&perPage={per_page}'
-        response_json = asyncio.run(self._send_request(path, self._headers))
+        path = f'{self._url}{self._org_id}/groups?page={page}&perPage={per_page}'
+        response_json = await self._request(path)
         return GroupsPage.from_dict(response_json)
-    
 
-    def get_group_members_v2(self, group_id) -> GroupMembers2:
+    def get_groups(self, page: int = 1, per_page: int = 10) -> GroupsPage:
+        """Get groups of an organization. Use API v1 method: https://yandex.ru/dev/api360/doc/ru/ref/GroupService/GroupService_List
+
+        Args:
+            page (int, optional): Page number. Defaults to 1.
+            per_page (int, optional): Number of groups per page. Defaults to 10.
+
+        Returns:
+            GroupsPage: List of groups
+        """
+
+        return self._run(self.get_groups_async(page, per_page))
+
+    async def get_all_groups_async(self, per_page: int = 100) -> list[Group]:
+        """Get all groups of an organization. Pages after the first one are fetched concurrently.
+
+        Args:
+            per_page (int, optional): Number of groups per page. Defaults to 100.
+
+        Returns:
+            list[Group]: List of groups
+        """
+
+        first_page = await self.get_groups_async(1, per_page)
+        in_flight = asyncio.Semaphore(self._max_in_flight)
+
+        async def fetch(page):
+            async with in_flight:
+                return await self.get_groups_async(page, per_page)
+
+        groups = list(first_page.groups)
+        for groups_page in await asyncio.gather(*(fetch(page) for page in range(2, first_page.pages + 1))):
+            groups.extend(groups_page.groups)
+        return groups
+
+    async def get_group_members_v2_async(self, group_id) -> GroupMembers2:
         """Get members of a group. Use API v2 method: https://yandex.ru/dev/api360/doc/ru/ref/GroupV2Service/GroupService_ListMembers
 
         Args:
@@ -144,14 +408,27 @@ class API360:
             GroupMembers2: Object with lists of group members
         """
 
-        path = f'{self.__url_v2}{self._org_id}/groups/{group_id}/members'
-        response_json = asyncio.run(self._send_request(path, self._headers))
+        path = f'{self._url_v2}{self._org_id}/groups/{group_id}/members'
+        response_json = await self._request(path)
 
         return GroupMembers2.from_dict(response_json)
 
-    async def get_service_app_token_async(client_id, client_secret, subject_token, subject_token_type = 'urn:yandex:params:oauth:token-type:uid'):
+    def get_group_members_v2(self, group_id) -> GroupMembers2:
+        """Get members of a group. Use API v2 method: https://yandex.ru/dev/api360/doc/ru/ref/GroupV2Service/GroupService_ListMembers
+
+        Args:
+            group_id (number): Group ID number. Use get_groups(page, per_page) to get IDs
+
+        Returns:
+            GroupMembers2: Object with lists of group members
+        """
+
+        return self._run(self.get_group_members_v2_async(group_id))
+
+    @staticmethod
+    async def get_service_app_token_async(client_id, client_secret, subject_token, subject_token_type = 'urn:yandex:params:oauth:token-type:uid', session: aiohttp.ClientSession = None):
         path, headers, data = API360._get_headers(client_id, client_secret, subject_token, subject_token_type)
-        response_json = await API360._send_request(path, headers, method='post', data=data)
+        response_json = await API360._send_request(path, headers, method='post', data=data, session=session)
         return response_json
 
 
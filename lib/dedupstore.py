@@ -0,0 +1,164 @@
+import asyncio
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import sys
+from typing import Awaitable, Callable
+
+from yadisk.objects import ResourceObject
+
+log = logging.getLogger('dedupstore')
+
+# Linux ioctl to share file extents (btrfs, xfs)
+FICLONE = 0x40049409
+
+
+class DedupStore:
+    """Content-addressed store of downloaded files keyed by sha256 or md5 from Disk.
+
+    Content is downloaded once: the first downloaded copy is hardlinked into the store,
+    later files with the same hash are linked from the store instead of downloading them
+    again, in the same run and in later runs for other users. Files of the same hash being
+    downloaded at the same time wait for one download. Downloaded content is checked against
+    the hash before it is added to the store.
+
+    Keep the store on the same filesystem as exported files, otherwise content is copied.
+
+    Args:
+        root (str): Store directory
+        link_mode (str, optional): 'reflink' - copy-on-write clone where the filesystem supports it,
+            then hardlink; 'hardlink' - hardlink only. Both fall back to copying. Defaults to 'reflink'.
+    """
+
+    def __init__(self, root: str, link_mode: str = 'reflink'):
+        self.__root = root
+        self.__link_mode = link_mode
+        self.__locks: dict[str, list] = {}
+        self.__linked = 0
+        self.__bytes_saved = 0
+        os.makedirs(root, exist_ok=True)
+
+    @property
+    def linked(self) -> int:
+        """Files linked from the store instead of downloading"""
+        return self.__linked
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.__bytes_saved
+
+    @staticmethod
+    def key(file: ResourceObject) -> str | None:
+        if file.sha256:
+            return 'sha256-' + file.sha256
+        if file.md5:
+            return 'md5-' + file.md5
+        return None
+
+    def __object_path(self, key: str) -> str:
+        digest = key.partition('-')[2]
+        return os.path.join(self.__root, digest[:2], key)
+
+    @staticmethod
+    def __reflink(source: str, target: str):
+        if sys.platform != 'linux':
+            raise OSError(errno.EOPNOTSUPP, 'reflink is not supported')
+        import fcntl
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            except OSError:
+                dst.close()
+                os.remove(target)
+                raise
+
+    def __clone(self, source: str, target: str):
+        """Link or copy source to target, replacing target"""
+
+        tmp_path = target + '.link'
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        methods = [self.__reflink, os.link] if self.__link_mode == 'reflink' else [os.link]
+        for method in methods:
+            try:
+                method(source, tmp_path)
+                break
+            except OSError:
+                continue
+        else:
+            shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, target)
+
+    @staticmethod
+    def __hash(path: str, key: str) -> str:
+        digest = hashlib.sha256() if key.startswith('sha256-') else hashlib.md5()
+        with open(path, 'rb') as f:
+            while chunk := f.read(1 << 20):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def __add(self, key: str, path: str):
+        actual = self.__hash(path, key)
+        if actual != key.partition('-')[2]:
+            raise ValueError(f'Downloaded content of {path} does not match {key}')
+        object_path = self.__object_path(key)
+        if os.path.exists(object_path):
+            return
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        try:
+            os.link(path, object_path)
+        except FileExistsError:
+            pass
+        except OSError as e:
+            log.warning(f'Failed to hardlink {path} into the store, copying: {e}')
+            self.__clone(path, object_path)
+
+    def __link_existing(self, key: str, target: str) -> bool:
+        object_path = self.__object_path(key)
+        if not os.path.exists(object_path):
+            return False
+        self.__clone(object_path, target)
+        return True
+
+    async def fetch(self, file: ResourceObject, target: str, download: Callable[[], Awaitable]) -> bool:
+        """Put file content to target: link it from the store or download it and add to the store.
+        Files without hash are just downloaded.
+
+        Args:
+            file (ResourceObject): Disk file
+            target (str): Local file path
+            download (Callable[[], Awaitable]): Coroutine function downloading file to target
+
+        Raises:
+            ValueError: Downloaded content does not match the hash, target is removed
+
+        Returns:
+            bool: True if content was linked from the store
+        """
+
+        key = self.key(file)
+        if key is None:
+            await download()
+            return False
+
+        lock = self.__locks.setdefault(key, [asyncio.Lock(), 0])
+        lock[1] += 1
+        try:
+            async with lock[0]:
+                if await asyncio.to_thread(self.__link_existing, key, target):
+                    self.__linked += 1
+                    self.__bytes_saved += file.size or 0
+                    return True
+                await download()
+                try:
+                    await asyncio.to_thread(self.__add, key, target)
+                except ValueError:
+                    os.remove(target)
+                    raise
+                return False
+        finally:
+            lock[1] -= 1
+            if not lock[1]:
+                del self.__locks[key]
@@ -1,7 +1,16 @@
 #from time import time
+import asyncio
+import importlib.util
+import logging
+import threading
+from contextlib import nullcontext
+from time import sleep
 import httpx
 import requests
-from typing import Self
+from typing import AsyncIterator, Iterator, Self
+
+from lib.jsonutil import decode, loads
+from lib.throttle import DEFAULT_RETRY_POLICY, AdaptiveRateController, RetryPolicy, TokenBucket
 
 class Resource():
     def __init__(self,
@@ -184,66 +193,254 @@ class DiskClientException(Exception):
 
 
 class DiskClient():
-    def __init__(self):
-        self.__httpx_client = httpx.Client(base_url='https://cloud-api.yandex.net')
+    def __init__(
+            self,
+            retry_policy: RetryPolicy = DEFAULT_RETRY_POLICY,
+            rate_controller: AdaptiveRateController = None,
+            max_in_flight: int = None
+    ):
+        """Yandex Disk REST API client. Safe to share between threads.
 
+        Args:
+            retry_policy (RetryPolicy, optional): Retries of throttled and failed requests.
+            rate_controller (AdaptiveRateController, optional): Rate limit of all requests. Defaults to 20-100 rps.
+            max_in_flight (int, optional): Maximum concurrent requests of all threads. Defaults to None - no limit.
+        """
 
-    def get_public_resources(self, token: str, limit: int = 100, offset: int = 0, type: str = None) -> PublicResourcesList:
+        limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight) if max_in_flight else httpx.Limits()
+        self.__httpx_client = httpx.Client(base_url='https://cloud-api.yandex.net', limits=limits)
+        self.__retry_policy = retry_policy
+        self.__rate_controller = rate_controller or AdaptiveRateController(TokenBucket(20), max_rate=100)
+        self.__in_flight = threading.BoundedSemaphore(max_in_flight) if max_in_flight else nullcontext()
+
+
+    def iter_public_resource_pages(self, token: str, limit: int = 100, offset: int = 0, type: str = None) -> Iterator[PublicResourcesList]:
+        """Iterate over pages of user public resources. Next page is requested when the previous one is consumed.
+
+        Args:
+            token (str): User OAuth token
+            limit (int, optional): Resources per page. Defaults to 100.
+            offset (int, optional): Offset of the first resource. Defaults to 0.
+            type (str, optional): Resource type filter: 'file' or 'dir'. Defaults to None.
+
+        Yields:
+            PublicResourcesList: Non-empty page of resources
+        """
 
         url = 'https://cloud-api.yandex.net/v1/disk/resources/public'
         headers = {'Authorization': 'OAuth ' + token}
-        params = {
-            'limit': limit,
-            'offset': offset,
-            'fields': 'limit,offset,items.public_key,items.public_url,items.name, items.created,items.modified,items.path,items.type,items.mime_type,items.size'
-            }
-        
-        if type:
-            params['type'] = type
+        params = _public_resources_params(limit, offset, type)
 
-        public_resource_list = PublicResourcesList(items=[], type='', limit=limit, offset=offset)
-        
         while True:
             #start_time = time()
-            res = self.__httpx_client.get(url, headers=headers, params=params)
+            res = self.__get(url, headers=headers, params=params)
             #end_time = time()
             #print(f'get_public_resources: {end_time - start_time}')
-            self.__check_response(res)
-            public_resource_part = PublicResourcesList.from_dict(res.json())
+            public_resource_part = decode(res.content, PublicResourcesList)
             if len(public_resource_part.items) == 0:
                 break
-            if len(public_resource_list.items) == 0:
-                public_resource_list = public_resource_part
-            else:
-                public_resource_list = public_resource_list.join(public_resource_part)
+            yield public_resource_part
             params['offset'] += limit
-        return public_resource_list
-        
-    
+
+    def iter_public_resources(self, token: str, limit: int = 100, offset: int = 0, type: str = None) -> Iterator[Resource]:
+        """Iterate over user public resources page by page. See iter_public_resource_pages"""
+
+        for public_resource_part in self.iter_public_resource_pages(token, limit, offset, type):
+            yield from public_resource_part.items
+
+    def get_public_resources(self, token: str, limit: int = 100, offset: int = 0, type: str = None) -> PublicResourcesList:
+        items: list[Resource] = []
+        resource_type = ''
+        for public_resource_part in self.iter_public_resource_pages(token, limit, offset, type):
+            if not items:
+                resource_type = public_resource_part.type
+            items.extend(public_resource_part.items)
+        return PublicResourcesList(items=items, type=resource_type, limit=limit, offset=offset)
 
     def get_public_settings(self, token: str, path: str) -> PublicSettings:
         url = '/v1/disk/public/resources/public-settings'
         headers = {'Authorization': 'OAuth ' + token}
         params = {'path': path, 'allow_address_access': True}
         #start_time = time()
-        res = self.__httpx_client.get(url, headers=headers, params=params)
+        res = self.__get(url, headers=headers, params=params)
         #end_time = time()
         #print(f'get_public_settings: {end_time - start_time}')
-        self.__check_response(res)
         
-        public_settings = PublicSettings.from_dict(res.json())
+        public_settings = decode(res.content, PublicSettings)
 
         return public_settings    
     
-    def __check_response(self, response: requests.Response):
-        if response.status_code == 401:
-            error_message = 'Error getting public resource. Please check if user is not blocked in your organization. '
-            error_message += f'Response code: {response.status_code} Response message: {response.text}'
+    def __get(self, url: str, headers: dict, params: dict) -> httpx.Response:
+        """GET with retries of throttled (429), failed (5xx) and reset requests"""
+
+        attempt = 0
+        while True:
+            self.__rate_controller.acquire_sync()
+            retry_after = None
+            try:
+                with self.__in_flight:
+                    res = self.__httpx_client.get(url, headers=headers, params=params)
+            except httpx.TransportError:
+                if not self.__retry_policy.can_retry(attempt):
+                    raise
+            else:
+                if res.status_code == 429:
+                    self.__rate_controller.on_throttled()
+                elif res.status_code == 200:
+                    self.__rate_controller.on_success()
+                if not self.__retry_policy.is_retryable_status(res.status_code) or not self.__retry_policy.can_retry(attempt):
+                    self.__check_response(res)
+                    return res
+                retry_after = res.headers.get('Retry-After')
 
-            raise DiskClientException(error_message)
-                
-        elif response.status_code != 200:
-            raise Exception(f'Error getting public resource: {response.status_code} : {response.text}')
+            sleep(self.__retry_policy.delay(attempt, retry_after))
+            attempt += 1
+
+    def __check_response(self, response: requests.Response):
+        _check_response(response)
 
     def close(self):
         self.__httpx_client.close()
+
+
+class AsyncDiskClient():
+    def __init__(
+            self,
+            retry_policy: RetryPolicy = DEFAULT_RETRY_POLICY,
+            rate_controller: AdaptiveRateController = None,
+            max_in_flight: int = 100,
+            http2: bool = False
+    ):
+        """Async Yandex Disk REST API client. One pooled connection is shared by requests of all users,
+        token is passed to every call.
+
+        Args:
+            retry_policy (RetryPolicy, optional): Retries of throttled and failed requests.
+            rate_controller (AdaptiveRateController, optional): Rate limit of all requests. Defaults to 20-100 rps.
+            max_in_flight (int, optional): Maximum concurrent requests. Defaults to 100.
+            http2 (bool, optional): Use HTTP/2 if h2 package is installed. Defaults to False.
+        """
+
+        if http2 and importlib.util.find_spec('h2') is None:
+            logging.getLogger('disk360').warning('h2 package is not installed, using HTTP/1.1')
+            http2 = False
+        self.__httpx_client = httpx.AsyncClient(
+            base_url='https://cloud-api.yandex.net',
+            limits=httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight),
+            http2=http2
+        )
+        self.__retry_policy = retry_policy
+        self.__rate_controller = rate_controller or AdaptiveRateController(TokenBucket(20), max_rate=100)
+        self.__in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.__httpx_client.aclose()
+
+    async def iter_public_resource_pages(self, token: str, limit: int = 100, offset: int = 0, type: str = None) -> AsyncIterator[PublicResourcesList]:
+        """Iterate over pages of user public resources. See DiskClient.iter_public_resource_pages"""
+
+        params = _public_resources_params(limit, offset, type)
+        while True:
+            res = await self.__request('GET', '/v1/disk/resources/public', token, params)
+            public_resource_part = decode(res.content, PublicResourcesList)
+            if len(public_resource_part.items) == 0:
+                break
+            yield public_resource_part
+            params['offset'] += limit
+
+    async def iter_public_resources(self, token: str, limit: int = 100, offset: int = 0, type: str = None) -> AsyncIterator[Resource]:
+        """Iterate over user public resources page by page"""
+
+        async for public_resource_part in self.iter_public_resource_pages(token, limit, offset, type):
+            for resource in public_resource_part.items:
+                yield resource
+
+    async def get_public_resources(self, token: str, limit: int = 100, offset: int = 0, type: str = None) -> PublicResourcesList:
+        items: list[Resource] = []
+        resource_type = ''
+        async for public_resource_part in self.iter_public_resource_pages(token, limit, offset, type):
+            if not items:
+                resource_type = public_resource_part.type
+            items.extend(public_resource_part.items)
+        return PublicResourcesList(items=items, type=resource_type, limit=limit, offset=offset)
+
+    async def get_public_settings(self, token: str, path: str) -> PublicSettings:
+        params = {'path': path, 'allow_address_access': True}
+        res = await self.__request('GET', '/v1/disk/public/resources/public-settings', token, params)
+        return decode(res.content, PublicSettings)
+
+    async def unpublish(self, token: str, path: str) -> dict:
+        """Remove public access to resource
+
+        Args:
+            token (str): User OAuth token
+            path (str): Resource path
+
+        Returns:
+            dict: Link to unpublished resource
+        """
+
+        res = await self.__request('PUT', '/v1/disk/resources/unpublish', token, {'path': path})
+        return loads(res.content)
+
+    async def check_token(self, token: str) -> bool:
+        try:
+            await self.__request('GET', '/v1/disk', token, {'fields': 'total_space'})
+        except Exception:
+            return False
+        return True
+
+    async def __request(self, method: str, url: str, token: str, params: dict) -> httpx.Response:
+        """Request with retries of throttled (429), failed (5xx) and reset requests"""
+
+        headers = {'Authorization': 'OAuth ' + token}
+        attempt = 0
+        while True:
+            await self.__rate_controller.acquire()
+            retry_after = None
+            try:
+                async with self.__in_flight:
+                    res = await self.__httpx_client.request(method, url, headers=headers, params=params)
+            except httpx.TransportError:
+                if not self.__retry_policy.can_retry(attempt):
+                    raise
+            else:
+                if res.status_code == 429:
+                    self.__rate_controller.on_throttled()
+                elif res.status_code == 200:
+                    self.__rate_controller.on_success()
+                if not self.__retry_policy.is_retryable_status(res.status_code) or not self.__retry_policy.can_retry(attempt):
+                    _check_response(res)
+                    return res
+                retry_after = res.headers.get('Retry-After')
+
+            await asyncio.sleep(self.__retry_policy.delay(attempt, retry_after))
+            attempt += 1
+
+
+def _public_resources_params(limit: int, offset: int, type: str = None) -> dict:
+    params = {
+        'limit': limit,
+        'offset': offset,
+        'fields': 'limit,offset,items.public_key,items.public_url,items.name, items.created,items.modified,items.path,items.type,items.mime_type,items.size'
+        }
+    if type:
+        params['type'] = type
+    return params
+
+
+def _check_response(response: httpx.Response):
+    if response.status_code == 401:
+        error_message = 'Error getting public resource. Please check if user is not blocked in your organization. '
+        error_message += f'Response code: {response.status_code} Response message: {response.text}'
+
+        raise DiskClientException(error_message)
+            
+    elif response.status_code != 200:
+        raise Exception(f'Error getting public resource: {response.status_code} : {response.text}')
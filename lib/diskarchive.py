@@ -0,0 +1,207 @@
+import asyncio
+import csv
+import importlib.util
+import tarfile
+import zipfile
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable
+
+from yadisk.objects import ResourceObject
+
+INDEX_FIELDS = ['path', 'size', 'md5', 'sha256', 'modified', 'offset', 'status']
+
+ARCHIVE_EXTENSIONS = {
+    ('tar', None): '.tar',
+    ('tar', 'gz'): '.tar.gz',
+    ('tar', 'zst'): '.tar.zst',
+    ('zip', None): '.zip',
+    ('zip', 'deflate'): '.zip',
+}
+
+
+def zstd_available() -> bool:
+    return importlib.util.find_spec('compression.zstd') is not None or importlib.util.find_spec('zstandard') is not None
+
+
+def _zstd_writer(f):
+    try:
+        from compression import zstd
+        return zstd.ZstdFile(f, 'wb')
+    except ImportError:
+        import zstandard
+        return zstandard.ZstdCompressor().stream_writer(f)
+
+
+class DiskArchive:
+    """Tar or zip archive written as a stream: file bodies go from the network straight into
+    the archive, nothing is staged on disk. Entries are written one at a time, `entry` holds
+    the archive until the body is written. Every entry is recorded in `<archive>.index.csv`.
+
+    A body that fails in the middle is padded (tar) or truncated (zip) and recorded with
+    status 'failed', so the archive stays readable.
+
+    Args:
+        path (str): Archive path without extension, see ARCHIVE_EXTENSIONS
+        format (str, optional): 'tar' or 'zip'. Defaults to 'tar'.
+        compression (str, optional): None, 'gz' or 'zst' for tar, None or 'deflate' for zip. Defaults to None.
+    """
+
+    def __init__(self, path: str, format: str = 'tar', compression: str = None):
+        if (format, compression) not in ARCHIVE_EXTENSIONS:
+            raise ValueError(f'Unsupported archive: {format} {compression}')
+        if compression == 'zst' and not zstd_available():
+            raise ValueError('zstd compression requires zstandard package')
+        self.__path = path + ARCHIVE_EXTENSIONS[(format, compression)]
+        self.__format = format
+        self.__compression = compression
+        self.__lock = asyncio.Lock()
+        self.__file = open(self.__path, 'wb')
+        self.__zstd = None
+        if format == 'zip':
+            self.__zip = zipfile.ZipFile(
+                self.__file, 'w',
+                compression=zipfile.ZIP_DEFLATED if compression == 'deflate' else zipfile.ZIP_STORED,
+                allowZip64=True
+            )
+        else:
+            fileobj = self.__file
+            if compression == 'zst':
+                self.__zstd = fileobj = _zstd_writer(self.__file)
+            mode = 'w|gz' if compression == 'gz' else 'w|'
+            self.__tar = tarfile.open(fileobj=fileobj, mode=mode, format=tarfile.PAX_FORMAT, encoding='utf-8')
+        self.__index_file = open(self.__path + '.index.csv', 'w', newline='', encoding='utf-8')
+        self.__index = csv.DictWriter(self.__index_file, INDEX_FIELDS)
+        self.__index.writeheader()
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    @property
+    def format(self) -> str:
+        return self.__format
+
+    async def close(self):
+        async with self.__lock:
+            await asyncio.to_thread(self.__close)
+
+    def __close(self):
+        if self.__format == 'zip':
+            self.__zip.close()
+        else:
+            self.__tar.close()
+            if self.__zstd is not None:
+                self.__zstd.close()
+        self.__file.close()
+        self.__index_file.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    @staticmethod
+    def __name(item: ResourceObject) -> str:
+        return item.path.removeprefix('disk:').lstrip('/')
+
+    @staticmethod
+    def __mtime(item: ResourceObject) -> datetime:
+        return item.modified or datetime.now()
+
+    def __zip_date_time(self, item: ResourceObject) -> tuple:
+        # Zip can not store dates before 1980
+        return max(self.__mtime(item).timetuple()[:6], (1980, 1, 1, 0, 0, 0))
+
+    def __write_index(self, item: ResourceObject, offset: int | None, status: str):
+        self.__index.writerow({
+            'path': item.path.removeprefix('disk:'),
+            'size': item.size,
+            'md5': item.md5,
+            'sha256': item.sha256,
+            'modified': item.modified.isoformat() if item.modified else '',
+            'offset': '' if offset is None else offset,
+            'status': status
+        })
+
+    async def add_directory(self, item: ResourceObject):
+        async with self.__lock:
+            name = self.__name(item) + '/'
+            if self.__format == 'zip':
+                info = zipfile.ZipInfo(name, date_time=self.__zip_date_time(item))
+                await asyncio.to_thread(self.__zip.writestr, info, b'')
+            else:
+                info = tarfile.TarInfo(name.rstrip('/'))
+                info.type = tarfile.DIRTYPE
+                info.mode = 0o755
+                info.mtime = self.__mtime(item).timestamp()
+                await asyncio.to_thread(self.__tar.addfile, info)
+
+    @asynccontextmanager
+    async def entry(self, item: ResourceObject) -> AsyncIterator[Callable[[bytes], Awaitable[None]]]:
+        """Hold the archive and write one file. Yields a coroutine function that writes body chunks.
+        Body shorter than item.size or an error inside the block records the entry as failed.
+
+        Args:
+            item (ResourceObject): Disk file, size is required for tar
+        """
+
+        async with self.__lock:
+            name = self.__name(item)
+            size = item.size or 0
+            written = 0
+            offset = None
+
+            if self.__format == 'zip':
+                info = zipfile.ZipInfo(name, date_time=self.__zip_date_time(item))
+                info.compress_type = self.__zip.compression
+                out = self.__zip.open(info, 'w', force_zip64=size >= zipfile.ZIP64_LIMIT)
+            else:
+                info = tarfile.TarInfo(name)
+                info.size = size
+                info.mode = 0o644
+                info.mtime = self.__mtime(item).timestamp()
+                # Header is written by hand, tarfile.addfile needs a blocking file object for the body
+                header = info.tobuf(self.__tar.format, self.__tar.encoding, self.__tar.errors)
+                await asyncio.to_thread(self.__tar.fileobj.write, header)
+                self.__tar.offset += len(header)
+                if self.__compression is None:
+                    offset = self.__tar.offset
+                out = self.__tar.fileobj
+
+            async def write(chunk: bytes):
+                nonlocal written
+                if self.__format == 'tar':
+                    chunk = chunk[:size - written]
+                await asyncio.to_thread(out.write, chunk)
+                written += len(chunk)
+
+            status = 'ok'
+            try:
+                yield write
+            except Exception:
+                status = 'failed'
+                raise
+            finally:
+                if written < size:
+                    status = 'failed'
+                if self.__format == 'zip':
+                    await asyncio.to_thread(out.close)
+                else:
+                    while written < size:
+                        padding = min(size - written, 1 << 20)
+                        await asyncio.to_thread(out.write, tarfile.NUL * padding)
+                        written += padding
+                    blocks, remainder = divmod(size, tarfile.BLOCKSIZE)
+                    if remainder:
+                        await asyncio.to_thread(out.write, tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+                        blocks += 1
+                    self.__tar.offset += blocks * tarfile.BLOCKSIZE
+                self.__write_index(item, offset, status)
+
+    async def add_bytes(self, item: ResourceObject, data: bytes):
+        """Write a file body received in memory"""
+
+        async with self.entry(item) as write:
+            await write(data)
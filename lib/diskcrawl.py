@@ -0,0 +1,173 @@
+import asyncio
+import logging
+from typing import AsyncIterator
+
+import yadisk
+from yadisk.objects import ResourceObject
+
+from lib.throttle import DEFAULT_RETRY_POLICY, AdaptiveRateController, RetryPolicy, TokenBucket
+
+log = logging.getLogger('diskcrawl')
+
+_DONE = object()
+
+
+class DiskCrawler:
+    """Breadth-first crawler of a user disk. Every directory is listed once and both
+    directories and files are collected in the same pass. Directories are listed by a pool
+    of workers, so listing of sibling folders overlaps.
+
+    Args:
+        client (yadisk.AsyncClient): Disk client of a user
+        workers (int, optional): Directories listed at the same time. Defaults to 10.
+        rate_controller (AdaptiveRateController, optional): Rate limit of listing requests. Defaults to 10-40 rps.
+        page_size (int, optional): Items requested per listing page. Defaults to 1000.
+        buffer (int, optional): Found items not consumed yet before workers pause. Defaults to 10000.
+        retry_policy (RetryPolicy, optional): Retries of throttled listing requests.
+    """
+
+    def __init__(
+            self,
+            client: yadisk.AsyncClient,
+            workers: int = 10,
+            rate_controller: AdaptiveRateController = None,
+            page_size: int = 1000,
+            buffer: int = 10000,
+            retry_policy: RetryPolicy = DEFAULT_RETRY_POLICY
+    ):
+        self.__client = client
+        self.__workers = workers
+        self.__rate_controller = rate_controller or AdaptiveRateController(TokenBucket(10), max_rate=40)
+        self.__page_size = page_size
+        self.__buffer = buffer
+        self.__retry_policy = retry_policy
+        self.__requests = 0
+        self.__errors: dict[str, Exception] = {}
+
+    @property
+    def requests(self) -> int:
+        """Listing requests made"""
+        return self.__requests
+
+    @property
+    def errors(self) -> dict[str, Exception]:
+        """Directories that could not be listed"""
+        return self.__errors
+
+    async def __call(self, method, *args, **kwargs):
+        """Rate limited request with retries of throttled requests"""
+
+        attempt = 0
+        while True:
+            await self.__rate_controller.acquire()
+            self.__requests += 1
+            try:
+                result = await method(*args, **kwargs)
+            except yadisk.exceptions.TooManyRequestsError:
+                self.__rate_controller.on_throttled()
+                if not self.__retry_policy.can_retry(attempt):
+                    raise
+                await asyncio.sleep(self.__retry_policy.delay(attempt))
+                attempt += 1
+                continue
+            self.__rate_controller.on_success()
+            return result
+
+    async def __list_page(self, path: str, offset: int) -> ResourceObject:
+        return await self.__call(self.__client.get_meta, path, limit=self.__page_size, offset=offset)
+
+    async def __files_page(self, offset: int) -> list[ResourceObject]:
+        async def page():
+            return [item async for item in self.__client.get_files(offset=offset, limit=self.__page_size, max_items=self.__page_size)]
+        return await self.__call(page)
+
+    async def list_directory(self, path: str) -> AsyncIterator[ResourceObject]:
+        """Iterate over items of one directory page by page"""
+
+        offset = 0
+        while True:
+            meta = await self.__list_page(path, offset)
+            items = meta.embedded.items if meta.embedded else None
+            if not items:
+                break
+            for item in items:
+                yield item
+            offset += len(items)
+            if meta.embedded.total is not None and offset >= meta.embedded.total:
+                break
+
+    async def crawl(self, path: str = '/') -> AsyncIterator[ResourceObject]:
+        """Iterate over all directories and files under path in breadth-first order.
+        Directories that fail to list are logged and collected in errors, crawl goes on.
+
+        Args:
+            path (str, optional): Root directory. Defaults to '/'.
+
+        Yields:
+            ResourceObject: Directories and files as they are found
+        """
+
+        pending: asyncio.Queue[str] = asyncio.Queue()
+        found: asyncio.Queue = asyncio.Queue(maxsize=self.__buffer)
+        pending.put_nowait(path)
+
+        async def worker():
+            while True:
+                directory = await pending.get()
+                try:
+                    async for item in self.list_directory(directory):
+                        if item.type == 'dir':
+                            pending.put_nowait(item.path)
+                        await found.put(item)
+                except Exception as e:
+                    log.error(f'Failed to list directory {directory}: {e}')
+                    self.__errors[directory] = e
+                finally:
+                    pending.task_done()
+
+        async def finish():
+            await pending.join()
+            await found.put(_DONE)
+
+        tasks = [asyncio.create_task(worker()) for _ in range(self.__workers)]
+        tasks.append(asyncio.create_task(finish()))
+        try:
+            while (item := await found.get()) is not _DONE:
+                yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def flat_files(self) -> AsyncIterator[ResourceObject]:
+        """Iterate over all user files with the flat files listing. The first page is requested
+        alone, if it is full the next pages are requested by windows of `workers` pages at once.
+        Listing stops at the first short page. Directories are not returned.
+
+        Yields:
+            ResourceObject: Files in listing order
+        """
+
+        items = await self.__files_page(0)
+        for item in items:
+            yield item
+        if len(items) < self.__page_size:
+            return
+
+        offset = self.__page_size
+        while True:
+            offsets = [offset + i * self.__page_size for i in range(self.__workers)]
+            tasks = [asyncio.create_task(self.__files_page(page_offset)) for page_offset in offsets]
+            try:
+                for task in tasks:
+                    items = await task
+                    for item in items:
+                        yield item
+                    if len(items) < self.__page_size:
+                        return
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+            offset = offsets[-1] + self.__page_size
+
@@ -0,0 +1,127 @@
+import sqlite3
+from time import monotonic, time
+
+from yadisk.objects import ResourceObject
+
+
+class DiskManifest:
+    """Local SQLite manifest of downloaded files of one user disk.
+
+    Every run lists the disk and checks each file against the manifest: a file is downloaded
+    again only if it is new or its size, md5, sha256 or modified time changed. Files are marked
+    as downloaded when the download completes, so an interrupted run continues with the files
+    it did not finish. Files not seen by a complete listing are reported as removed.
+
+    Writes are committed in batches, a crash loses at most the last batch of marks and
+    these files are downloaded again.
+
+    Args:
+        path (str): SQLite database file
+        commit_every (int, optional): Changes per commit. Defaults to 500.
+        commit_interval (float, optional): Maximum seconds between commits. Defaults to 5.
+    """
+
+    def __init__(self, path: str, commit_every: int = 500, commit_interval: float = 5):
+        self.__db = sqlite3.connect(path)
+        self.__db.executescript('''
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                md5 TEXT,
+                sha256 TEXT,
+                modified TEXT,
+                downloaded INTEGER NOT NULL DEFAULT 0,
+                seen_run INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        ''')
+        row = self.__db.execute("SELECT value FROM meta WHERE key = 'run'").fetchone()
+        self.__run = int(row[0]) + 1 if row else 1
+        self.__db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('run', ?)", (str(self.__run),))
+        self.__db.commit()
+        self.__commit_every = commit_every
+        self.__commit_interval = commit_interval
+        self.__changes = 0
+        self.__committed = monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.__db.commit()
+        self.__db.close()
+
+    @property
+    def run(self) -> int:
+        """Number of current run"""
+        return self.__run
+
+    @property
+    def completed_at(self) -> float | None:
+        """Unix time of last run with complete listing"""
+
+        row = self.__db.execute("SELECT value FROM meta WHERE key = 'completed_at'").fetchone()
+        return float(row[0]) if row else None
+
+    def __len__(self) -> int:
+        return self.__db.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+
+    def __changed(self):
+        self.__changes += 1
+        if self.__changes >= self.__commit_every or monotonic() - self.__committed >= self.__commit_interval:
+            self.__db.commit()
+            self.__changes = 0
+            self.__committed = monotonic()
+
+    def check(self, item: ResourceObject) -> bool:
+        """Record a listed file. Returns True if the file is new, changed or was not downloaded yet"""
+
+        path = item.path.removeprefix('disk:')
+        modified = item.modified.isoformat() if item.modified else None
+        row = self.__db.execute(
+            'SELECT size, md5, sha256, modified, downloaded FROM files WHERE path = ?', (path,)
+        ).fetchone()
+        if row and row[4] == 1 and row[:4] == (item.size, item.md5, item.sha256, modified):
+            self.__db.execute('UPDATE files SET seen_run = ? WHERE path = ?', (self.__run, path))
+            self.__changed()
+            return False
+        self.__db.execute(
+            'INSERT OR REPLACE INTO files (path, size, md5, sha256, modified, downloaded, seen_run) VALUES (?, ?, ?, ?, ?, 0, ?)',
+            (path, item.size, item.md5, item.sha256, modified, self.__run)
+        )
+        self.__changed()
+        return True
+
+    def mark_downloaded(self, item: ResourceObject, pending: bool = False):
+        """Mark a file as downloaded. Pending marks count only after confirm_pending,
+        e.g. when the archive with the file is closed"""
+
+        self.__db.execute('UPDATE files SET downloaded = ? WHERE path = ?', (2 if pending else 1, item.path.removeprefix('disk:')))
+        self.__changed()
+
+    def confirm_pending(self):
+        with self.__db:
+            self.__db.execute('UPDATE files SET downloaded = 1 WHERE downloaded = 2')
+        self.__changes = 0
+        self.__committed = monotonic()
+
+    def complete(self) -> list[str]:
+        """Finish a run with complete listing: remove files not seen by this run from the manifest.
+
+        Returns:
+            list[str]: Paths of files removed from the disk since the previous run
+        """
+
+        with self.__db:
+            removed = [path for path, in self.__db.execute('SELECT path FROM files WHERE seen_run < ?', (self.__run,))]
+            self.__db.execute('DELETE FROM files WHERE seen_run < ?', (self.__run,))
+            self.__db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('completed_at', ?)", (str(time()),))
+        self.__changes = 0
+        self.__committed = monotonic()
+        return removed
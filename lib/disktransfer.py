@@ -0,0 +1,253 @@
+import asyncio
+import json
+import os
+from typing import AsyncIterator, Awaitable, Callable
+
+import httpx
+
+from lib.disk360 import DiskClientException
+from lib.throttle import DEFAULT_RETRY_POLICY, AdaptiveConcurrencyLimiter, RetryPolicy
+
+
+class RangeDownloader:
+    """Download files by chunks into `<target>.part` and resume interrupted transfers with HTTP Range.
+
+    Progress of long and interrupted transfers is kept in `<target>.part.json` next to the partial
+    file together with file size and version, so a transfer continues after connection errors and after restart of the
+    program, unless the remote file has changed. Files larger than two segments are split into
+    ranges downloaded in parallel. The partial file is renamed to target when all ranges are done.
+
+    Args:
+        http_client (httpx.AsyncClient, optional): Client for download links. Defaults to a new client.
+        chunk_size (int, optional): Bytes read per write. Defaults to 1 MB.
+        segment_size (int, optional): Minimum size of a parallel range. Defaults to 256 MB.
+        max_segments (int, optional): Maximum parallel ranges of one file. Defaults to 4.
+        save_every (int, optional): Bytes written between progress saves. Defaults to 16 MB.
+        retry_policy (RetryPolicy, optional): Retries of failed and reset transfers.
+        limiter (AdaptiveConcurrencyLimiter, optional): Limiter notified of transferred bytes,
+            throttling and timeouts. Defaults to None.
+    """
+
+    def __init__(
+            self,
+            http_client: httpx.AsyncClient = None,
+            chunk_size: int = 1 << 20,
+            segment_size: int = 256 << 20,
+            max_segments: int = 4,
+            save_every: int = 16 << 20,
+            retry_policy: RetryPolicy = DEFAULT_RETRY_POLICY,
+            limiter: AdaptiveConcurrencyLimiter = None
+    ):
+        self.__http_client = http_client or httpx.AsyncClient(follow_redirects=True, timeout=httpx.Timeout(60))
+        self.__chunk_size = chunk_size
+        self.__segment_size = segment_size
+        self.__max_segments = max_segments
+        self.__save_every = save_every
+        self.__retry_policy = retry_policy
+        self.__limiter = limiter
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.__http_client.aclose()
+
+    def __split(self, size: int | None) -> list[list[int]]:
+        """Ranges as [start, position, end], end is exclusive. None end means up to end of file"""
+
+        if not size:
+            return [[0, 0, size]]
+        segments = max(1, min(self.__max_segments, size // self.__segment_size))
+        step = -(-size // segments)
+        return [[start, start, min(size, start + step)] for start in range(0, size, step)]
+
+    @staticmethod
+    def __load_state(state_path: str, size: int | None, version: str | None) -> list[list[int]] | None:
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('size') != size or state.get('version') != version:
+            return None
+        return state.get('ranges')
+
+    @staticmethod
+    def __save_state(state_path: str, size: int | None, version: str | None, ranges: list[list[int]]):
+        tmp_path = state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'size': size, 'version': version, 'ranges': ranges}, f)
+        os.replace(tmp_path, state_path)
+
+    async def iter_chunks(self, get_link: Callable[[], Awaitable[str]], size: int = None) -> AsyncIterator[bytes]:
+        """Stream a file without saving it. After connection errors the stream continues
+        from the last received byte with HTTP Range.
+
+        Args:
+            get_link (Callable[[], Awaitable[str]]): Coroutine function returning a download link
+            size (int, optional): File size. Defaults to None.
+
+        Raises:
+            DiskClientException: Download link response is not successful and can not be retried
+
+        Yields:
+            bytes: File content chunks
+        """
+
+        link: str | None = None
+        position = 0
+        attempt = 0
+        while size is None or position < size:
+            retry_after = None
+            try:
+                if link is None:
+                    link = await get_link()
+                headers = {'Range': f'bytes={position}-'} if position else {}
+                async with self.__http_client.stream('GET', link, headers=headers) as res:
+                    if res.status_code == 200 and position:
+                        raise DiskClientException(f'Server does not support ranges: {link}')
+                    if res.status_code in (200, 206):
+                        async for chunk in res.aiter_bytes(self.__chunk_size):
+                            position += len(chunk)
+                            attempt = 0
+                            yield chunk
+                        if size is None or position >= size:
+                            if self.__limiter:
+                                self.__limiter.on_success(position)
+                            return
+                        error = DiskClientException(f'Connection closed at {position} of {size} bytes: {link}')
+                    else:
+                        if res.status_code in (429, 503) and self.__limiter:
+                            self.__limiter.on_throttled()
+                        if res.status_code in (403, 404, 410):
+                            link = None
+                        elif not self.__retry_policy.is_retryable_status(res.status_code):
+                            raise DiskClientException(f'Error downloading {link}: {res.status_code}')
+                        retry_after = res.headers.get('Retry-After')
+                        error = DiskClientException(f'Error downloading {link}: {res.status_code}')
+            except httpx.TransportError as e:
+                if isinstance(e, httpx.TimeoutException) and self.__limiter:
+                    self.__limiter.on_throttled()
+                error = e
+            if not self.__retry_policy.can_retry(attempt):
+                raise error
+            await asyncio.sleep(self.__retry_policy.delay(attempt, retry_after))
+            attempt += 1
+
+    async def download(self, get_link: Callable[[], Awaitable[str]], target: str, size: int = None, version: str = None) -> int:
+        """Download a file or continue a partial download of the same file version
+
+        Args:
+            get_link (Callable[[], Awaitable[str]]): Coroutine function returning a download link.
+                Called again after errors, links expire.
+            target (str): Local file path
+            size (int, optional): File size, required for parallel ranges. Defaults to None.
+            version (str, optional): md5 or other file version, partial file of another version is discarded. Defaults to None.
+
+        Raises:
+            DiskClientException: Download link response is not successful and can not be retried
+
+        Returns:
+            int: Bytes transferred by this call
+        """
+
+        part_path = target + '.part'
+        state_path = part_path + '.json'
+        partial = os.path.exists(part_path)
+        ranges = self.__load_state(state_path, size, version) if partial else None
+        saved = partial and (ranges is not None or os.path.exists(state_path))
+        if ranges is None:
+            ranges = self.__split(size)
+            with open(part_path, 'wb') as f:
+                if size:
+                    f.truncate(size)
+
+        link: str | None = None
+        transferred = 0
+        unsaved = 0
+        handles = [open(part_path, 'r+b') for _ in ranges]
+
+        def save():
+            # Progress is saved only for long or interrupted transfers, small files cost no extra writes.
+            # Saved positions must not be ahead of data written by any range
+            nonlocal saved
+            for handle in handles:
+                handle.flush()
+            self.__save_state(state_path, size, version, ranges)
+            saved = True
+
+        async def fetch_range(byte_range: list[int], f):
+            nonlocal link, transferred, unsaved
+            attempt = 0
+            while byte_range[2] is None or byte_range[1] < byte_range[2]:
+                retry_after = None
+                try:
+                    if link is None:
+                        link = await get_link()
+                    headers = {}
+                    if byte_range[1] or len(ranges) > 1:
+                        end = '' if byte_range[2] is None else byte_range[2] - 1
+                        headers['Range'] = f'bytes={byte_range[1]}-{end}'
+                    async with self.__http_client.stream('GET', link, headers=headers) as res:
+                        if res.status_code == 200 and 'Range' in headers:
+                            if len(ranges) > 1:
+                                raise DiskClientException(f'Server does not support ranges: {target}')
+                            # Range is ignored, start over
+                            byte_range[1] = 0
+                        if res.status_code in (200, 206):
+                            f.seek(byte_range[1])
+                            async for chunk in res.aiter_bytes(self.__chunk_size):
+                                if byte_range[2] is not None:
+                                    chunk = chunk[:byte_range[2] - byte_range[1]]
+                                f.write(chunk)
+                                byte_range[1] += len(chunk)
+                                transferred += len(chunk)
+                                unsaved += len(chunk)
+                                attempt = 0
+                                if unsaved >= self.__save_every:
+                                    save()
+                                    unsaved = 0
+                            if byte_range[2] is None:
+                                byte_range[2] = byte_range[1]
+                            continue
+                        if res.status_code in (429, 503) and self.__limiter:
+                            self.__limiter.on_throttled()
+                        if res.status_code in (403, 404, 410):
+                            # Link expired
+                            link = None
+                        elif not self.__retry_policy.is_retryable_status(res.status_code):
+                            raise DiskClientException(f'Error downloading {target}: {res.status_code}')
+                        retry_after = res.headers.get('Retry-After')
+                        error = DiskClientException(f'Error downloading {target}: {res.status_code}')
+                except httpx.TransportError as e:
+                    if isinstance(e, httpx.TimeoutException) and self.__limiter:
+                        self.__limiter.on_throttled()
+                    error = e
+                save()
+                if not self.__retry_policy.can_retry(attempt):
+                    raise error
+                await asyncio.sleep(self.__retry_policy.delay(attempt, retry_after))
+                attempt += 1
+
+        tasks = [asyncio.create_task(fetch_range(byte_range, f)) for byte_range, f in zip(ranges, handles)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if any(end is None or position < end for _, position, end in ranges):
+                save()
+            for f in handles:
+                f.close()
+        if size is not None and os.path.getsize(part_path) != size:
+            raise DiskClientException(f'Downloaded size of {target} does not match: {os.path.getsize(part_path)} != {size}')
+        os.replace(part_path, target)
+        if saved:
+            os.remove(state_path)
+        if self.__limiter:
+            self.__limiter.on_success(transferred)
+        return transferred
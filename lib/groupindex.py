@@ -0,0 +1,127 @@
+import asyncio
+import csv
+import json
+from typing import Iterable
+
+from lib.api360 import API360
+from lib.types import Group, GroupMemberType, GroupMembers2, ShortUser
+
+
+class GroupIndex:
+    """All groups of an organization with their members and inverted index from user to groups.
+
+    A user is a member of a group directly, through a department listed in group members,
+    or through a nested group. Departments are matched by user department_id only,
+    sub-departments are not expanded.
+
+    Args:
+        groups (Iterable[Group]): All groups of an organization
+        members (dict[int, GroupMembers2]): Members of each group from get_group_members_v2
+        users (Iterable[ShortUser], optional): Users to resolve department members. Defaults to None.
+    """
+
+    def __init__(self, groups: Iterable[Group], members: dict[int, GroupMembers2], users: Iterable[ShortUser] = None):
+        self.__groups: dict[int, Group] = {group.group_id: group for group in groups}
+        self.__user_groups: dict[str, set[int]] = {}
+        self.__parents: dict[int, set[int]] = {}
+        self.__ancestors: dict[int, frozenset[int]] = {}
+
+        department_users: dict[str, list[str]] = {}
+        for user in users or []:
+            department_users.setdefault(str(user.department_id), []).append(str(user.uid))
+
+        for group_id, group_members in members.items():
+            for user in group_members.users:
+                self.__user_groups.setdefault(str(user.uid), set()).add(group_id)
+            for subgroup in group_members.groups:
+                self.__parents.setdefault(subgroup.group_id, set()).add(group_id)
+
+        for group in self.__groups.values():
+            for member in group.members:
+                if member.type == GroupMemberType.DEPARTMENT:
+                    for uid in department_users.get(str(member.member_id), []):
+                        self.__user_groups.setdefault(uid, set()).add(group.group_id)
+
+    @classmethod
+    async def build(cls, api: API360, users: Iterable[ShortUser] = None, max_in_flight: int = 10) -> 'GroupIndex':
+        """Crawl all groups and their members
+
+        Args:
+            api (API360): Directory API client
+            users (Iterable[ShortUser], optional): Users to resolve department members. Defaults to None.
+            max_in_flight (int, optional): Maximum concurrent members requests. Defaults to 10.
+
+        Returns:
+            GroupIndex: Index of groups
+        """
+
+        groups = await api.get_all_groups_async()
+        in_flight = asyncio.Semaphore(max_in_flight)
+
+        async def fetch(group_id):
+            async with in_flight:
+                return group_id, await api.get_group_members_v2_async(group_id)
+
+        members = dict(await asyncio.gather(*(fetch(group.group_id) for group in groups)))
+        return cls(groups, members, users)
+
+    @property
+    def groups(self) -> dict[int, Group]:
+        return self.__groups
+
+    def __ancestors_of(self, group_id: int) -> frozenset[int]:
+        """Groups that contain group_id directly or through other groups"""
+
+        ancestors = self.__ancestors.get(group_id)
+        if ancestors is None:
+            found: set[int] = set()
+            stack = list(self.__parents.get(group_id, ()))
+            while stack:
+                parent = stack.pop()
+                if parent not in found:
+                    found.add(parent)
+                    stack.extend(self.__parents.get(parent, ()))
+            ancestors = frozenset(found)
+            self.__ancestors[group_id] = ancestors
+        return ancestors
+
+    def direct_groups(self, user_id: str) -> set[int]:
+        """Groups where user is a member directly or through department"""
+
+        return set(self.__user_groups.get(str(user_id), ()))
+
+    def user_groups(self, user_id: str) -> set[int]:
+        """All groups of a user including groups that contain user groups"""
+
+        direct = self.__user_groups.get(str(user_id), ())
+        groups = set(direct)
+        for group_id in direct:
+            groups |= self.__ancestors_of(group_id)
+        return groups
+
+    def user_ids(self) -> list[str]:
+        return list(self.__user_groups)
+
+    def to_dict(self) -> dict[str, list[int]]:
+        return {user_id: sorted(self.user_groups(user_id)) for user_id in self.__user_groups}
+
+    def export_json(self, file_path: str):
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+
+    def export_csv(self, file_path: str):
+        """Write one row per user and group: UserId, GroupId, GroupName, Direct"""
+
+        with open(file_path, 'w', newline='', encoding='utf-8') as f:
+            w = csv.DictWriter(f, ['UserId', 'GroupId', 'GroupName', 'Direct'])
+            w.writeheader()
+            for user_id in self.__user_groups:
+                direct = self.__user_groups[user_id]
+                for group_id in sorted(self.user_groups(user_id)):
+                    group = self.__groups.get(group_id)
+                    w.writerow({
+                        'UserId': user_id,
+                        'GroupId': group_id,
+                        'GroupName': group.name if group else '',
+                        'Direct': group_id in direct
+                    })
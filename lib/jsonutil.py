@@ -0,0 +1,62 @@
+"""JSON decoding for API responses. Uses orjson or msgspec when installed, stdlib json otherwise."""
+
+import json
+from typing import Callable
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _stdlib_loads(data: bytes | str):
+    return json.loads(data)
+
+
+_decoders: dict[str, Callable] = {'json': _stdlib_loads}
+if msgspec is not None:
+    _decoders['msgspec'] = msgspec.json.Decoder().decode
+if orjson is not None:
+    _decoders['orjson'] = orjson.loads
+
+_name: str = next(name for name in ('orjson', 'msgspec', 'json') if name in _decoders)
+_loads: Callable = _decoders[_name]
+
+
+def available() -> list[str]:
+    return list(_decoders)
+
+
+def decoder_name() -> str:
+    return _name
+
+
+def use(name: str):
+    """Select decoder by name: 'orjson', 'msgspec' or 'json'
+
+    Raises:
+        ValueError: Decoder is not installed
+    """
+
+    global _name, _loads
+    if name not in _decoders:
+        raise ValueError(f'JSON decoder {name} is not available. Available: {", ".join(_decoders)}')
+    _name = name
+    _loads = _decoders[name]
+
+
+def loads(data: bytes | str):
+    """Decode JSON document from response body bytes"""
+
+    return _loads(data)
+
+
+def decode(data: bytes | str, cls):
+    """Decode response body bytes into a type with from_dict, e.g. UsersPage"""
+
+    return cls.from_dict(_loads(data))
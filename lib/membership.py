@@ -0,0 +1,149 @@
+import asyncio
+from enum import Enum
+
+from lib.api360 import API360
+
+
+class MembershipAction(Enum):
+    ADD = 'add'
+    REMOVE = 'remove'
+
+
+class MembershipChange:
+    def __init__(self, group_id: int, user_id: str, action: MembershipAction):
+        self.__group_id = group_id
+        self.__user_id = user_id
+        self.__action = action
+
+    @property
+    def group_id(self) -> int:
+        return self.__group_id
+
+    @property
+    def user_id(self) -> str:
+        return self.__user_id
+
+    @property
+    def action(self) -> MembershipAction:
+        return self.__action
+
+
+class MembershipResult:
+    def __init__(self, change: MembershipChange, success: bool, error: Exception = None):
+        self.__change = change
+        self.__success = success
+        self.__error = error
+
+    @property
+    def change(self) -> MembershipChange:
+        return self.__change
+
+    @property
+    def success(self) -> bool:
+        return self.__success
+
+    @property
+    def error(self) -> Exception | None:
+        return self.__error
+
+
+class GroupMembershipEngine:
+    """Bring group members to desired state with minimal number of requests.
+
+    Current members of every target group are fetched with get_group_members_v2, only missing
+    users are added (and, optionally, extra users removed). Requests run concurrently,
+    API360 rate limit and retries apply to each of them.
+
+    Args:
+        api (API360): Directory API client
+        max_in_flight (int, optional): Maximum concurrent requests. Defaults to 10.
+    """
+
+    def __init__(self, api: API360, max_in_flight: int = 10):
+        self.__api = api
+        self.__max_in_flight = max_in_flight
+
+    async def current_members(self, group_ids) -> dict[int, set[str]]:
+        """Get user members of groups
+
+        Args:
+            group_ids (Iterable[int]): Group IDs
+
+        Returns:
+            dict[int, set[str]]: User IDs by group ID
+        """
+
+        in_flight = asyncio.Semaphore(self.__max_in_flight)
+
+        async def fetch(group_id):
+            async with in_flight:
+                members = await self.__api.get_group_members_v2_async(group_id)
+                return group_id, {str(user.uid) for user in members.users}
+
+        return dict(await asyncio.gather(*(fetch(group_id) for group_id in group_ids)))
+
+    @staticmethod
+    def diff(desired: dict[int, set[str]], current: dict[int, set[str]], remove: bool = False) -> list[MembershipChange]:
+        """Get changes that turn current members into desired
+
+        Args:
+            desired (dict[int, set[str]]): Desired user IDs by group ID
+            current (dict[int, set[str]]): Current user IDs by group ID
+            remove (bool, optional): Remove users that are not in desired. Defaults to False.
+
+        Returns:
+            list[MembershipChange]: Changes to apply
+        """
+
+        changes = []
+        for group_id, user_ids in desired.items():
+            members = current.get(group_id, set())
+            changes.extend(
+                MembershipChange(group_id, user_id, MembershipAction.ADD) for user_id in sorted(user_ids - members)
+            )
+            if remove:
+                changes.extend(
+                    MembershipChange(group_id, user_id, MembershipAction.REMOVE) for user_id in sorted(members - user_ids)
+                )
+        return changes
+
+    async def apply(self, changes: list[MembershipChange]) -> list[MembershipResult]:
+        """Apply changes concurrently. One failed change does not stop the others
+
+        Args:
+            changes (list[MembershipChange]): Changes to apply
+
+        Returns:
+            list[MembershipResult]: Results in the same order as changes
+        """
+
+        in_flight = asyncio.Semaphore(self.__max_in_flight)
+
+        async def send(change: MembershipChange):
+            async with in_flight:
+                try:
+                    if change.action == MembershipAction.ADD:
+                        response = await self.__api.add_user_to_group_async(change.user_id, change.group_id)
+                        return MembershipResult(change, bool(response.get('added')))
+                    response = await self.__api.remove_user_from_group_async(change.user_id, change.group_id)
+                    return MembershipResult(change, bool(response.get('deleted')))
+                except Exception as e:
+                    return MembershipResult(change, False, e)
+
+        return await asyncio.gather(*(send(change) for change in changes))
+
+    async def sync(self, desired: dict[int, set[str]], remove: bool = False) -> tuple[list[MembershipResult], int]:
+        """Fetch current members, compute and apply changes
+
+        Args:
+            desired (dict[int, set[str]]): Desired user IDs by group ID
+            remove (bool, optional): Remove users that are not in desired. Defaults to False.
+
+        Returns:
+            tuple[list[MembershipResult], int]: Results of sent changes and number of memberships already in place
+        """
+
+        current = await self.current_members(desired.keys())
+        changes = self.diff(desired, current, remove)
+        in_place = sum(len(user_ids & current.get(group_id, set())) for group_id, user_ids in desired.items())
+        return await self.apply(changes), in_place
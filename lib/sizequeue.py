@@ -0,0 +1,72 @@
+import asyncio
+import heapq
+from collections import deque
+from itertools import count
+from typing import Generic, TypeVar
+
+T = TypeVar('T')
+
+
+class SizeAwareQueue(Generic[T]):
+    """Queue of files for download workers that balances work by file size.
+
+    Large files are served largest first and preferred by workers with dedicated large slots,
+    so they start as soon as they are listed instead of after everything queued before them.
+    Small files are served in order and preferred by the other workers. Workers take the other
+    class when their own is empty. Only small files are bounded by capacity, put waits when it
+    is full, large files are few and kept all.
+
+    Args:
+        large_size (int): Files of this size and larger are large
+        capacity (int, optional): Maximum small files waiting. Defaults to 1000.
+    """
+
+    def __init__(self, large_size: int, capacity: int = 1000):
+        self.__large_size = large_size
+        self.__capacity = capacity
+        self.__large: list[tuple[int, int, T]] = []
+        self.__small: deque[T] = deque()
+        self.__order = count()
+        self.__closed = False
+        self.__condition = asyncio.Condition()
+
+    def __len__(self) -> int:
+        return len(self.__large) + len(self.__small)
+
+    @property
+    def large_waiting(self) -> int:
+        return len(self.__large)
+
+    async def put(self, item: T, size: int):
+        async with self.__condition:
+            if size >= self.__large_size:
+                heapq.heappush(self.__large, (-size, next(self.__order), item))
+            else:
+                await self.__condition.wait_for(lambda: len(self.__small) < self.__capacity)
+                self.__small.append(item)
+            self.__condition.notify_all()
+
+    async def close(self):
+        """No more files will be put, workers get None when the queue is empty"""
+
+        async with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+    async def get(self, large_slot: bool = False) -> T | None:
+        """Get next file, waits until a file is put. Returns None when the queue is closed and empty
+
+        Args:
+            large_slot (bool, optional): Prefer large files. Defaults to False.
+        """
+
+        async with self.__condition:
+            await self.__condition.wait_for(lambda: self.__large or self.__small or self.__closed)
+            if self.__large and (large_slot or not self.__small):
+                item = heapq.heappop(self.__large)[2]
+            elif self.__small:
+                item = self.__small.popleft()
+            else:
+                return None
+            self.__condition.notify_all()
+            return item
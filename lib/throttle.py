@@ -0,0 +1,297 @@
+import asyncio
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from time import monotonic, sleep
+
+
+class TokenBucket:
+    """Token bucket rate limiter. Can be used from asyncio code (acquire) and from threads (acquire_sync).
+    One bucket can be shared by several threads.
+
+    Args:
+        rate (float): Tokens added per second. None or 0 disables limiting
+        capacity (float, optional): Maximum burst size. Defaults to max(1, rate)
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self._rate = rate
+        self._capacity = capacity or max(1.0, rate or 1.0)
+        self._tokens = self._capacity
+        self._updated = monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    @rate.setter
+    def rate(self, value: float):
+        with self._lock:
+            self._refill()
+            self._rate = value
+
+    @property
+    def capacity(self) -> float:
+        return self._capacity
+
+    def _refill(self):
+        now = monotonic()
+        if self._rate:
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def _take(self, tokens: float) -> float:
+        """Take tokens if available. Returns 0 on success or number of seconds to wait before next try"""
+
+        with self._lock:
+            if not self._rate:
+                return 0
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0
+            return (tokens - self._tokens) / self._rate
+
+    async def acquire(self, tokens: float = 1):
+        """Wait until `tokens` are available and take them"""
+
+        while wait := self._take(tokens):
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, tokens: float = 1):
+        """Blocking version of acquire"""
+
+        while wait := self._take(tokens):
+            sleep(wait)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+class AdaptiveRateController:
+    """Adjust token bucket rate by responses: additive increase while requests succeed,
+    multiplicative decrease on throttling (HTTP 429).
+
+    Args:
+        bucket (TokenBucket): Rate limiter to control
+        min_rate (float, optional): Lowest rate in requests per second. Defaults to 1.
+        max_rate (float, optional): Highest rate in requests per second. Defaults to bucket rate.
+        increase (float, optional): Rate increase per second of successful requests. Defaults to 1.
+        decrease (float, optional): Rate multiplier on throttling. Defaults to 0.5.
+    """
+
+    def __init__(
+            self,
+            bucket: TokenBucket,
+            min_rate: float = 1,
+            max_rate: float = None,
+            increase: float = 1,
+            decrease: float = 0.5
+    ):
+        self._bucket = bucket
+        self._min_rate = min_rate
+        self._max_rate = max_rate or bucket.rate
+        self._increase = increase
+        self._decrease = decrease
+        self._last_decrease = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self._bucket.rate
+
+    async def acquire(self):
+        await self._bucket.acquire()
+
+    def acquire_sync(self):
+        self._bucket.acquire_sync()
+
+    def on_success(self):
+        rate = self._bucket.rate
+        if rate and rate < self._max_rate:
+            self._bucket.rate = min(self._max_rate, rate + self._increase / rate)
+
+    def on_throttled(self):
+        # Requests that were in flight together get 429 together, count them as one signal
+        now = monotonic()
+        rate = self._bucket.rate
+        if rate and now - self._last_decrease >= 1 / rate:
+            self._bucket.rate = max(self._min_rate, rate * self._decrease)
+            self._last_decrease = now
+
+
+
+class AdaptiveConcurrencyLimiter:
+    """Limit of concurrent operations adjusted by results (AIMD). Every `window` seconds the limit
+    grows by `increase` if there was no throttling, all slots were busy and throughput did not drop.
+    Throttling (HTTP 429, timeouts) cuts the limit by `decrease` at most once per window.
+    Used from one event loop.
+
+    Args:
+        initial (int, optional): Starting limit. Defaults to 10.
+        min_limit (int, optional): Lowest limit. Defaults to 1.
+        max_limit (int, optional): Highest limit. Defaults to 100.
+        increase (int, optional): Limit increase per window. Defaults to 1.
+        decrease (float, optional): Limit multiplier on throttling. Defaults to 0.5.
+        window (float, optional): Seconds between limit increases. Defaults to 2.
+    """
+
+    def __init__(
+            self,
+            initial: int = 10,
+            min_limit: int = 1,
+            max_limit: int = 100,
+            increase: int = 1,
+            decrease: float = 0.5,
+            window: float = 2
+    ):
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._limit = float(max(min_limit, min(max_limit, initial)))
+        self._increase = increase
+        self._decrease = decrease
+        self._window = window
+        self._in_flight = 0
+        self._condition = asyncio.Condition()
+        self._window_start = monotonic()
+        self._window_amount = 0.0
+        self._window_saturated = False
+        self._window_throttled = False
+        self._throughput = 0.0
+        self._last_decrease = 0.0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def throughput(self) -> float:
+        """Amount per second in the last complete window"""
+        return self._throughput
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < int(self._limit))
+            self._in_flight += 1
+            if self._in_flight >= int(self._limit):
+                self._window_saturated = True
+
+    async def release(self):
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.release()
+
+    def on_success(self, amount: float = 1):
+        """Record completed work, e.g. bytes transferred"""
+
+        self._window_amount += amount
+        now = monotonic()
+        elapsed = now - self._window_start
+        if elapsed < self._window:
+            return
+        throughput = self._window_amount / elapsed
+        if not self._window_throttled and self._window_saturated and throughput >= self._throughput * 0.9:
+            self._limit = min(self._max_limit, self._limit + self._increase)
+        self._throughput = throughput
+        self._window_start = now
+        self._window_amount = 0.0
+        self._window_saturated = self._in_flight >= int(self._limit)
+        self._window_throttled = False
+
+    def on_throttled(self):
+        # Operations that were in flight together fail together, count them as one signal
+        now = monotonic()
+        self._window_throttled = True
+        if now - self._last_decrease >= self._window:
+            self._limit = max(self._min_limit, self._limit * self._decrease)
+            self._last_decrease = now
+
+
+def parse_retry_after(value: str) -> float | None:
+    """Parse Retry-After header value: number of seconds or HTTP date. Returns seconds to wait."""
+
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """Retry policy for throttled (429), failed (5xx) and reset requests.
+    Exponential backoff with full jitter, Retry-After header has priority when present.
+
+    Args:
+        attempts (int, optional): Number of retries after the first request. Defaults to 5.
+        base_delay (float, optional): Backoff base in seconds. Defaults to 0.5.
+        max_delay (float, optional): Backoff cap in seconds. Defaults to 30.
+        max_retry_after (float, optional): Cap for Retry-After value in seconds. Defaults to 300.
+        statuses (tuple[int], optional): HTTP statuses to retry. Defaults to 429, 500, 502, 503, 504.
+    """
+
+    def __init__(
+            self,
+            attempts: int = 5,
+            base_delay: float = 0.5,
+            max_delay: float = 30,
+            max_retry_after: float = 300,
+            statuses: tuple[int, ...] = (429, 500, 502, 503, 504)
+    ):
+        self._attempts = attempts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._max_retry_after = max_retry_after
+        self._statuses = frozenset(statuses)
+
+    @property
+    def attempts(self) -> int:
+        return self._attempts
+
+    def can_retry(self, attempt: int) -> bool:
+        return attempt < self._attempts
+
+    def is_retryable_status(self, status: int) -> bool:
+        return status in self._statuses
+
+    def delay(self, attempt: int, retry_after: str = None) -> float:
+        """Get delay before retry
+
+        Args:
+            attempt (int): Retry number starting from 0
+            retry_after (str, optional): Retry-After header value
+
+        Returns:
+            float: Seconds to wait
+        """
+
+        retry_after_seconds = parse_retry_after(retry_after)
+        if retry_after_seconds is not None:
+            return min(retry_after_seconds, self._max_retry_after)
+        return random.uniform(0, min(self._max_delay, self._base_delay * 2 ** attempt))
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
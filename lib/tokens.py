@@ -0,0 +1,176 @@
+import asyncio
+import json
+import os
+from time import time
+
+import aiohttp
+
+from lib.api360 import API360
+from lib.throttle import TokenBucket
+
+TOKEN_TYPE_UID = 'urn:yandex:params:oauth:token-type:uid'
+TOKEN_TYPE_EMAIL = 'urn:yandex:params:oauth:token-type:email'
+
+
+class TokenCache:
+    """Cache of service application tokens keyed by subject and subject token type.
+    Tokens are kept until `expires_in` from token response runs out.
+
+    Args:
+        client_id (str): Service application client ID
+        client_secret (str): Service application secret
+        path (str, optional): JSON file to persist tokens between runs. Created with 0600 permissions.
+            Defaults to None - memory only.
+        expiry_margin (float, optional): Seconds before expiration when token is considered expired. Defaults to 60.
+    """
+
+    def __init__(self, client_id: str, client_secret: str, path: str = None, expiry_margin: float = 60):
+        self.__client_id = client_id
+        self.__client_secret = client_secret
+        self.__path = path
+        self.__expiry_margin = expiry_margin
+        self.__tokens: dict[str, tuple[str, float]] = {}
+        self.__pending: dict[str, asyncio.Future] = {}
+        if path:
+            self.__load()
+
+    @staticmethod
+    def __key(subject: str, subject_token_type: str) -> str:
+        return f'{subject_token_type} {subject}'
+
+    def __cached(self, key: str) -> str | None:
+        entry = self.__tokens.get(key)
+        if entry and entry[1] - self.__expiry_margin > time():
+            return entry[0]
+        return None
+
+    def __store(self, key: str, response: dict, save: bool = True) -> str:
+        if 'error' in response:
+            raise Exception(f'Get token error: {response["error"]}: {response.get("error_description")}')
+        # Tokens without expires_in are kept for current run only
+        expires_at = time() + float(response.get('expires_in', self.__expiry_margin * 2))
+        self.__tokens[key] = (response['access_token'], expires_at)
+        if save:
+            self.save()
+        return response['access_token']
+
+    def __load(self):
+        try:
+            with open(self.__path, 'r', encoding='utf8') as f:
+                stored = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        now = time()
+        self.__tokens = {key: (token, expires_at) for key, (token, expires_at) in stored.items() if expires_at > now}
+
+    def save(self):
+        """Write not expired tokens to cache file. No-op for memory only cache"""
+
+        if not self.__path:
+            return
+        now = time()
+        tokens = {key: entry for key, entry in self.__tokens.items() if entry[1] > now}
+        tmp_path = f'{self.__path}.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf8') as f:
+            json.dump(tokens, f)
+        os.replace(tmp_path, self.__path)
+
+    def get(self, subject: str, subject_token_type: str = TOKEN_TYPE_UID) -> str:
+        """Get token from cache or exchange it with oauth.yandex.ru
+
+        Args:
+            subject (str): User ID or email
+            subject_token_type (str, optional): TOKEN_TYPE_UID or TOKEN_TYPE_EMAIL. Defaults to TOKEN_TYPE_UID.
+
+        Returns:
+            str: Access token
+        """
+
+        key = self.__key(subject, subject_token_type)
+        token = self.__cached(key)
+        if token:
+            return token
+        response = API360.get_service_app_token(self.__client_id, self.__client_secret, subject, subject_token_type)
+        return self.__store(key, response)
+
+    async def get_async(
+            self,
+            subject: str,
+            subject_token_type: str = TOKEN_TYPE_UID,
+            session: aiohttp.ClientSession = None,
+            save: bool = True
+    ) -> str:
+        """Async version of get. Concurrent requests for the same subject share one exchange.
+
+        Args:
+            subject (str): User ID or email
+            subject_token_type (str, optional): TOKEN_TYPE_UID or TOKEN_TYPE_EMAIL. Defaults to TOKEN_TYPE_UID.
+            session (aiohttp.ClientSession, optional): Session to send request with. Defaults to None.
+            save (bool, optional): Write cache file after exchange. Defaults to True.
+
+        Returns:
+            str: Access token
+        """
+
+        key = self.__key(subject, subject_token_type)
+        token = self.__cached(key)
+        if token:
+            return token
+        if key in self.__pending:
+            return await asyncio.shield(self.__pending[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self.__pending[key] = future
+        try:
+            response = await API360.get_service_app_token_async(
+                self.__client_id, self.__client_secret, subject, subject_token_type, session=session
+            )
+            token = self.__store(key, response, save=save)
+            future.set_result(token)
+            return token
+        except Exception as e:
+            future.set_exception(e)
+            # Exception is delivered to waiters, mark it retrieved for the case there are none
+            future.exception()
+            raise
+        finally:
+            del self.__pending[key]
+
+    async def prefetch(
+            self,
+            subjects: list[str],
+            subject_token_type: str = TOKEN_TYPE_UID,
+            requests_per_second: float = 10,
+            max_in_flight: int = 10
+    ) -> dict[str, Exception]:
+        """Get tokens for many subjects concurrently. Cached tokens are not requested again.
+
+        Args:
+            subjects (list[str]): User IDs or emails
+            subject_token_type (str, optional): TOKEN_TYPE_UID or TOKEN_TYPE_EMAIL. Defaults to TOKEN_TYPE_UID.
+            requests_per_second (float, optional): Token exchange rate limit. Defaults to 10.
+            max_in_flight (int, optional): Maximum concurrent exchanges. Defaults to 10.
+
+        Returns:
+            dict[str, Exception]: Errors by subject
+        """
+
+        rate_limiter = TokenBucket(requests_per_second)
+        in_flight = asyncio.Semaphore(max_in_flight)
+        errors: dict[str, Exception] = {}
+
+        async def fetch(subject, session):
+            if self.__cached(self.__key(subject, subject_token_type)):
+                return
+            async with in_flight:
+                await rate_limiter.acquire()
+                try:
+                    await self.get_async(subject, subject_token_type, session=session, save=False)
+                except Exception as e:
+                    errors[subject] = e
+
+        async with aiohttp.ClientSession() as session:
+            await asyncio.gather(*(fetch(subject, session) for subject in dict.fromkeys(subjects)))
+        self.save()
+        return errors
@@ -1,14 +1,24 @@
 from enum import Enum
 import json
+from sys import intern
 from typing import List
 
 
+def _intern(value: str | None) -> str | None:
+    """Intern a string value, None and empty values are returned as is"""
+    return intern(value) if value else value
+
+
 class _BaseObject(object):
+    __slots__ = ()
+
     def to_json(self):
         return json.dumps(self)
 
 
 class Name(_BaseObject):
+    __slots__ = ('__first', '__last', '__middle')
+
     def __init__(self, first, last, middle):
         self.__first = first
         self.__last = last
@@ -22,6 +32,13 @@ class Name(_BaseObject):
             middle=obj['middle']
         )
 
+    def to_dict(self) -> dict:
+        return {
+            'first': self.__first,
+            'last': self.__last,
+            'middle': self.__middle
+        }
+
     @property
     def first(self):
         return self.__first
@@ -36,6 +53,8 @@ class Name(_BaseObject):
 
 
 class Contact(_BaseObject):
+    __slots__ = ('__type', '__value', '__main', '__alias', '__synthetic')
+
     def __init__(
             self,
             ctype,
@@ -60,6 +79,25 @@ class Contact(_BaseObject):
             synthetic=obj['synthetic']
         )
 
+    @staticmethod
+    def pack(obj: dict) -> tuple:
+        """Compact representation of API contact for storage in User"""
+
+        return _intern(obj['type']), obj['value'], obj['main'], obj['alias'], obj['synthetic']
+
+    @classmethod
+    def unpack(cls, packed: tuple):
+        return cls(*packed)
+
+    def to_dict(self) -> dict:
+        return {
+            'type': self.__type,
+            'value': self.__value,
+            'main': self.__main,
+            'alias': self.__alias,
+            'synthetic': self.__synthetic
+        }
+
     @property
     def type(self):
         return self.__type
@@ -81,6 +119,8 @@ class Contact(_BaseObject):
         return self.__synthetic
 
 class ShortUser(_BaseObject):
+    __slots__ = ('__uid', '__nickname', '__department_id', '__email', '__name', '__gender', '__position', '__avatar_id')
+
     def __init__(self, uid, nickname, department_id, email, name, gender, position, avatar_id):
         self.__uid = uid
         self.__nickname = nickname
@@ -99,8 +139,8 @@ class ShortUser(_BaseObject):
             department_id=obj['departmentId'],
             email=obj['email'],
             name=Name.from_dict(obj['name']),
-            gender=obj['gender'],
-            position=obj['position'],
+            gender=_intern(obj['gender']),
+            position=_intern(obj['position']),
             avatar_id=obj['avatarId']
         )
     
@@ -138,6 +178,15 @@ class ShortUser(_BaseObject):
     
 
 class User(ShortUser):
+    """Organization user. Contacts are stored packed in tuples and turned into Contact objects on access.
+    Low-cardinality strings (gender, position, timezone, language) are interned and shared between users."""
+
+    __slots__ = (
+        '__is_enabled', '__about', '__birthday', '__external_id', '__is_admin', '__is_robot', '__is_dismissed',
+        '__timezone', '__language', '__created_at', '__updated_at', '__display_name', '__groups', '__contacts',
+        '__aliases'
+    )
+
     def __init__(
             self,
             uid,
@@ -190,25 +239,54 @@ class User(ShortUser):
             department_id=obj['departmentId'],
             name=Name.from_dict(obj['name']),
             is_enabled=obj['isEnabled'],
-            gender=obj['gender'],
-            position=obj['position'],
+            gender=_intern(obj['gender']),
+            position=_intern(obj['position']),
             avatar_id=obj['avatarId'],
             about=obj['about'],
-            birthday=obj['birthday'],
+            birthday=_intern(obj['birthday']),
             external_id=obj['externalId'],
             is_admin=obj['isAdmin'],
             is_robot=obj['isRobot'],
             is_dismissed=obj['isDismissed'],
-            timezone=obj['timezone'],
-            language=obj['language'],
+            timezone=_intern(obj['timezone']),
+            language=_intern(obj['language']),
             created_at=obj['createdAt'],
             updated_at=obj['updatedAt'],
             display_name=obj.get('displayName', ''),
-            groups=[group for group in obj.get('groups')],
-            contacts=[Contact.from_dict(contact) for contact in obj['contacts']],
-            aliases=[alias for alias in obj['aliases']]
+            groups=obj.get('groups'),
+            contacts=tuple(Contact.pack(contact) for contact in obj['contacts']),
+            aliases=obj['aliases']
         )
 
+    def to_dict(self) -> dict:
+        """Convert user back to API representation"""
+
+        return {
+            'id': self.uid,
+            'email': self.email,
+            'nickname': self.nickname,
+            'departmentId': self.department_id,
+            'name': self.name.to_dict(),
+            'isEnabled': self.__is_enabled,
+            'gender': self.gender,
+            'position': self.position,
+            'avatarId': self.avatar_id,
+            'about': self.__about,
+            'birthday': self.__birthday,
+            'externalId': self.__external_id,
+            'isAdmin': self.__is_admin,
+            'isRobot': self.__is_robot,
+            'isDismissed': self.__is_dismissed,
+            'timezone': self.__timezone,
+            'language': self.__language,
+            'createdAt': self.__created_at,
+            'updatedAt': self.__updated_at,
+            'displayName': self.__display_name,
+            'groups': self.__groups,
+            'contacts': [contact.to_dict() for contact in self.contacts],
+            'aliases': self.__aliases
+        }
+
     @property
     def is_enabled(self):
         return self.__is_enabled
@@ -262,7 +340,9 @@ class User(ShortUser):
         return self.__groups
 
     @property
-    def contacts(self):
+    def contacts(self) -> list[Contact]:
+        if isinstance(self.__contacts, tuple):
+            return [Contact.unpack(contact) for contact in self.__contacts]
         return self.__contacts
 
     @property
@@ -271,6 +351,8 @@ class User(ShortUser):
 
 
 class UsersPage(_BaseObject):
+    __slots__ = ('_users', '_page', '_pages', '_per_page', '_total')
+
     def __init__(self, users, page, pages, per_page, total):
         self._users = users
         self._page = page
@@ -310,6 +392,8 @@ class UsersPage(_BaseObject):
 
 
 class ShortGroup(_BaseObject):
+    __slots__ = ('__group_id', '__name', '__members_count')
+
     def __init__(self, group_id: int, group_name: str, members_count: int):
         self.__group_id = group_id
         self.__name = group_name
@@ -341,6 +425,8 @@ class GroupMemberType(Enum):
     DEPARTMENT = 'department'
 
 class GroupMember(_BaseObject):
+    __slots__ = ('__member_id', '__type')
+
     def __init__ (self, member_id: str, type: GroupMemberType):
         self.__member_id = member_id
         self.__type = type
@@ -361,6 +447,13 @@ class GroupMember(_BaseObject):
         )
     
 class Group(ShortGroup):
+    """Organization group. Members are kept as received from API and parsed on first access"""
+
+    __slots__ = (
+        '__type', '__description', '__label', '__email', '__aliases', '__external_id', '__removed', '__members',
+        '__admin_ids', '__author_id', '__member_of', '__created_at'
+    )
+
     def __init__(
         self, 
         group_id: int,
@@ -423,7 +516,10 @@ class Group(ShortGroup):
 
     @property
     def members(self) -> list[GroupMember]:
-        return self.__members
+        members = self.__members
+        if members and isinstance(members[0], dict):
+            members = self.__members = [GroupMember.from_dict(member) for member in members]
+        return members
 
     @property
     def admin_ids(self) -> list[str]:
@@ -452,17 +548,19 @@ class Group(ShortGroup):
             members_count=obj['membersCount'],
             label=obj['label'],
             email=obj['email'],
-            aliases=[alias for alias in obj['aliases']],
+            aliases=obj['aliases'],
             external_id=obj['externalId'],
             removed=obj['removed'],
-            members=[GroupMember.from_dict(member) for member in obj['members']],
-            admin_ids=[admin_id for admin_id in obj['adminIds']],
+            members=obj['members'],
+            admin_ids=obj['adminIds'],
             author_id=obj['authorId'],
-            member_of=[m_of for m_of in obj['memberOf']],
+            member_of=obj['memberOf'],
             created_at=obj['createdAt']
         )
     
 class GroupsPage(_BaseObject):
+    __slots__ = ('__groups', '__page', '__pages', '__per_page', '__total')
+
     def __init__(self, groups: list[Group], page: int, pages: int, per_page: int, total: int):
         self.__groups = groups
         self.__page = page
@@ -501,6 +599,8 @@ class GroupsPage(_BaseObject):
         )
 
 class GroupMembers2(_BaseObject):
+    __slots__ = ('__groups', '__users')
+
     def __init__(self, groups, users):
         self.__groups = groups
         self.__users = users
@@ -0,0 +1,123 @@
+import json
+import sqlite3
+from time import time
+from typing import Iterator
+
+from lib.api360 import API360
+from lib.types import User
+
+
+class SyncReport:
+    def __init__(self):
+        self.added: list[str] = []
+        self.changed: list[str] = []
+        self.removed: list[str] = []
+        self.unchanged: int = 0
+
+
+class UserCache:
+    """Local SQLite store of organization users keyed by user ID.
+
+    Directory API has no filter by modification time, so sync still lists all users pages,
+    but only users with new updatedAt are parsed into the store and written. Tools that can
+    work with a recent snapshot use load(api, max_age) and skip the API entirely.
+
+    Args:
+        path (str, optional): SQLite database file. Defaults to 'users_cache.db'.
+    """
+
+    def __init__(self, path: str = 'users_cache.db'):
+        self.__db = sqlite3.connect(path)
+        self.__db.executescript('''
+            CREATE TABLE IF NOT EXISTS users (
+                uid TEXT PRIMARY KEY,
+                updated_at TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        ''')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.__db.close()
+
+    @property
+    def synced_at(self) -> float | None:
+        """Unix time of last completed sync"""
+
+        row = self.__db.execute("SELECT value FROM meta WHERE key = 'synced_at'").fetchone()
+        return float(row[0]) if row else None
+
+    def __len__(self) -> int:
+        return self.__db.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+    def get(self, uid: str) -> User | None:
+        row = self.__db.execute('SELECT data FROM users WHERE uid = ?', (uid,)).fetchone()
+        return User.from_dict(json.loads(row[0])) if row else None
+
+    def __iter__(self) -> Iterator[User]:
+        for data, in self.__db.execute('SELECT data FROM users ORDER BY uid'):
+            yield User.from_dict(json.loads(data))
+
+    def get_all(self) -> list[User]:
+        return list(self)
+
+    async def sync(self, api: API360) -> SyncReport:
+        """Refresh store from API. Store is updated in one transaction, interrupted sync leaves previous state.
+
+        Args:
+            api (API360): Directory API client
+
+        Returns:
+            SyncReport: Added, changed and removed user IDs
+        """
+
+        report = SyncReport()
+        cached: dict[str, str] = dict(self.__db.execute('SELECT uid, updated_at FROM users'))
+        seen: set[str] = set()
+
+        with self.__db:
+            async for user in api.iter_users():
+                seen.add(user.uid)
+                updated_at = cached.get(user.uid)
+                if updated_at == user.updated_at:
+                    report.unchanged += 1
+                    continue
+                if updated_at is None:
+                    report.added.append(user.uid)
+                else:
+                    report.changed.append(user.uid)
+                self.__db.execute(
+                    'INSERT OR REPLACE INTO users (uid, updated_at, data) VALUES (?, ?, ?)',
+                    (user.uid, user.updated_at, json.dumps(user.to_dict(), ensure_ascii=False))
+                )
+
+            report.removed = [uid for uid in cached if uid not in seen]
+            self.__db.executemany('DELETE FROM users WHERE uid = ?', ((uid,) for uid in report.removed))
+            self.__db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('synced_at', ?)", (str(time()),))
+
+        return report
+
+    async def load(self, api: API360, max_age: float = None) -> list[User]:
+        """Get all users. Store is synced first unless last sync is younger than max_age seconds.
+
+        Args:
+            api (API360): Directory API client
+            max_age (float, optional): Maximum age of cached data in seconds. Defaults to None - always sync.
+
+        Returns:
+            list[User]: List of users
+        """
+
+        synced_at = self.synced_at
+        if max_age is None or synced_at is None or time() - synced_at > max_age:
+            await self.sync(api)
+        return self.get_all()
@@ -0,0 +1,84 @@
+from typing import Iterable
+
+from lib.types import ShortUser, User
+
+
+class UserIndex:
+    """Case-insensitive lookup of organization users by ID, email, nickname and aliases.
+    Built once, every lookup is a dict access.
+
+    When several users share a key, the first one wins. Primary emails have priority
+    over contact emails, and both have priority over nicknames and aliases.
+
+    Args:
+        users (Iterable[ShortUser]): Users to index, e.g. API360.get_all_users()
+    """
+
+    def __init__(self, users: Iterable[ShortUser]):
+        self.__by_uid: dict[str, ShortUser] = {}
+        self.__by_email: dict[str, ShortUser] = {}
+        self.__by_login: dict[str, ShortUser] = {}
+        self.__domains: set[str] = set()
+        contact_emails: list[tuple[str, ShortUser]] = []
+
+        for user in users:
+            self.__by_uid.setdefault(str(user.uid), user)
+            if user.email:
+                self.__by_email.setdefault(user.email.lower(), user)
+                self.__domains.add(user.email.lower().rpartition('@')[2])
+            if user.nickname:
+                self.__by_login.setdefault(user.nickname.lower(), user)
+            if isinstance(user, User):
+                for alias in user.aliases:
+                    self.__by_login.setdefault(alias.lower(), user)
+                for contact in user.contacts:
+                    if contact.type == 'email' and contact.value:
+                        contact_emails.append((contact.value.lower(), user))
+
+        for email, user in contact_emails:
+            self.__by_email.setdefault(email, user)
+
+    @classmethod
+    async def from_api(cls, api) -> 'UserIndex':
+        """Build index from all users of an organization
+
+        Args:
+            api (API360): Directory API client
+
+        Returns:
+            UserIndex: Index of organization users
+        """
+
+        return cls([user async for user in api.iter_users()])
+
+    def __len__(self) -> int:
+        return len(self.__by_uid)
+
+    def __contains__(self, key: str) -> bool:
+        return self.find(key) is not None
+
+    def by_uid(self, uid: str) -> ShortUser | None:
+        return self.__by_uid.get(str(uid))
+
+    def by_email(self, email: str) -> ShortUser | None:
+        """Find user by primary or contact email. For organization domains falls back
+        to nickname and aliases by email local part"""
+
+        email = email.strip().lower()
+        user = self.__by_email.get(email)
+        if user is None:
+            login, _, domain = email.rpartition('@')
+            if domain in self.__domains:
+                user = self.__by_login.get(login)
+        return user
+
+    def by_login(self, login: str) -> ShortUser | None:
+        return self.__by_login.get(login.strip().lower())
+
+    def find(self, key: str) -> ShortUser | None:
+        """Find user by ID, email, nickname or alias"""
+
+        key = str(key).strip()
+        if '@' in key:
+            return self.by_email(key)
+        return self.by_uid(key) or self.by_login(key)
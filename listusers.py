@@ -1,73 +1,103 @@
+import argparse
 import asyncio
 import csv
 import logging
 import os
-from time import sleep
+from argparse import ArgumentParser
+from datetime import datetime
+from textwrap import dedent
 from dotenv import load_dotenv
 from lib.api360 import API360
+from lib.usercache import UserCache
 
 
 load_dotenv()
 
-FETCH_RATE = 0.1
-
 api = API360(api_key=os.getenv('TOKEN'), org_id=os.getenv('ORG_ID'), log_level=logging.INFO)
 
 
-def fetch_all_users(pages):
-    """Fetch all users per page."""
-    org_users = []
-    for page in range(1, pages + 1):
-        org_users.extend(fetch_users_by_page(page))
-        sleep(FETCH_RATE)
-    print(f"Всего загружено пользователей: {len(org_users)}")
-    return org_users
-
-
-def fetch_users_by_page(page):
-    """Fetch all users from exact page"""
-
-    print(f"Загрузка пользователей. Страница {page}")
-    org_users = []
-    users_page = asyncio.run(api.get_users_page(page))
-    for org_user in users_page.users:
-        org_users.append(
-            {
-                'ID': org_user.uid,
-                'Email': org_user.email,
-                'Login': org_user.nickname,
-                'Fname': org_user.name.first,
-                'Lname': org_user.name.last,
-                'Mname': org_user.name.middle,
-                'DisplayName': org_user.display_name,
-                'Position': org_user.position,
-                'Language': org_user.language,
-                'Timezone': org_user.timezone,
-                'Admin': org_user.is_admin,
-                'Enabled': org_user.is_enabled
-            })
-
-    return org_users
-
-
-def save_users_to_csv(user_records):
-    with open('users.csv', 'w', newline='', encoding='utf-8') as f:
-        keys = user_records[0].keys()
+USER_FIELDS = ['ID', 'Email', 'Login', 'Fname', 'Lname', 'Mname', 'DisplayName',
+               'Position', 'Language', 'Timezone', 'Admin', 'Enabled']
+
+
+def arg_parser() -> ArgumentParser:
+    parser = ArgumentParser(
+        description=dedent("""
+        Скрипт выгружает всех пользователей организации в файл users.csv
+        Параметры:
+        --cache <file.db> - локальный кэш пользователей. Загружаются только изменения с прошлого запуска.
+        --max-age <секунды> - не обращаться к API, если кэш обновлялся не раньше указанного времени.
+        """),
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--cache', type=str, required=False, help='Файл локального кэша пользователей')
+    parser.add_argument('--max-age', type=float, required=False, help='Максимальный возраст кэша в секундах')
+    return parser
+
+
+async def export_users(file_name='users.csv', cache: UserCache = None, max_age: float = None):
+    """Write users to CSV file row by row as pages arrive. With cache, users are loaded from cache,
+    which is synced first unless it is younger than max_age seconds."""
+    exported = 0
+    cached_users = None
+    if cache is not None:
+        cached_users = await cache.load(api, max_age)
+        print(f"Пользователей в кэше: {len(cached_users)}, "
+              f"обновлен: {datetime.fromtimestamp(cache.synced_at):%Y-%m-%d %H:%M:%S}")
+
+    with open(file_name, 'w', newline='', encoding='utf-8') as f:
         # noinspection PyTypeChecker
-        w = csv.DictWriter(f, keys)
+        w = csv.DictWriter(f, USER_FIELDS)
         w.writeheader()
-        w.writerows(user_records)
+        org_users = iter_cached(cached_users) if cached_users is not None else api.iter_users()
+        async for org_user in org_users:
+            w.writerow(user_to_record(org_user))
+            exported += 1
+            if exported % 1000 == 0:
+                print(f"Загружено пользователей: {exported}")
+    print(f"Всего загружено пользователей: {exported}")
+    return exported
+
+
+async def iter_cached(users: list):
+    for org_user in users:
+        yield org_user
+
+
+def user_to_record(org_user):
+    return {
+        'ID': org_user.uid,
+        'Email': org_user.email,
+        'Login': org_user.nickname,
+        'Fname': org_user.name.first,
+        'Lname': org_user.name.last,
+        'Mname': org_user.name.middle,
+        'DisplayName': org_user.display_name,
+        'Position': org_user.position,
+        'Language': org_user.language,
+        'Timezone': org_user.timezone,
+        'Admin': org_user.is_admin,
+        'Enabled': org_user.is_enabled
+    }
+
+
+async def main():
+    args = arg_parser().parse_args()
+    async with api:
+        total_users, total_pages = await api.count_pages()
+        print(f"Всего пользователей: {total_users}")
+        print(f"Всего страниц: {total_pages}")
+
+        start = input("Пользователи будут импортированы в файл users.csv. Начинаем? y/n: ")
+        if start.lower() == 'y':
+            if args.cache:
+                with UserCache(args.cache) as cache:
+                    await export_users(cache=cache, max_age=args.max_age)
+            else:
+                await export_users()
+            print('Готово!')
 
 
 if __name__ == '__main__':
-    total_users, total_pages = asyncio.run(api.count_pages())
-    print(f"Всего пользователей: {total_users}")
-    print(f"Всего страниц: {total_pages}")
-
-    start = input("Пользователи будут импортированы в файл users.csv. Начинаем? y/n: ")
-    if start.lower() == 'y':
-        users = fetch_all_users(total_pages)
-        save_users_to_csv(users)
-        print('Готово!')
-
+    asyncio.run(main())
     exit(0)
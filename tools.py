@@ -1,20 +1,29 @@
+import asyncio
 import csv
 import logging
 import os
 import sys
-from lib.api360 import API360
+from lib.tokens import TOKEN_TYPE_EMAIL, TokenCache
+
+_token_cache: TokenCache | None = None
+
+def token_cache() -> TokenCache:
+    """Shared service app token cache. Set TOKEN_CACHE in .env to keep tokens between runs"""
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = TokenCache(
+            client_id=os.getenv('CLIENT_ID'),
+            client_secret=os.getenv('CLIENT_SECRET'),
+            path=os.getenv('TOKEN_CACHE')
+        )
+    return _token_cache
 
 def get_service_app_token(email: str) -> str:
-    response = API360.get_service_app_token(
-        client_id=os.getenv('CLIENT_ID'),
-        client_secret=os.getenv('CLIENT_SECRET'),
-        subject_token=email,
-        subject_token_type='urn:yandex:params:oauth:token-type:email'
-    )
-    if 'error' in response:
-        raise Exception(f'Get token error: {response["error"]}: {response["error_description"]}')
+    return token_cache().get(email, TOKEN_TYPE_EMAIL)
 
-    return(response['access_token'])
+def prefetch_service_app_tokens(subjects: list[str], subject_token_type: str = TOKEN_TYPE_EMAIL) -> dict[str, Exception]:
+    """Get tokens for all users before processing. Failed users are retried by get_service_app_token later"""
+    return asyncio.run(token_cache().prefetch(subjects, subject_token_type))
 
 def logger(logger_name: str, file_name: str, log_level = logging.DEBUG, no_console = False) -> logging.Logger:
     log_logger = logging.getLogger(logger_name)
@@ -2,14 +2,13 @@ from argparse import ArgumentParser
 import argparse
 import csv
 import logging
-import os
 import sys
 from textwrap import dedent
-from time import sleep
-import yadisk
+import asyncio
 from dotenv import load_dotenv
-from yadisk.objects import SyncPublicResourceObject, SyncResourceLinkObject
-from lib.api360 import API360
+from lib.disk360 import AsyncDiskClient, Resource
+from lib.tokens import TOKEN_TYPE_EMAIL
+from tools import token_cache
 
 load_dotenv()
 
@@ -34,10 +33,12 @@ def arg_parser() -> ArgumentParser:
         Скрипт УДАЛЯЕТ все настроенные доступы для файлов и папок в диске.
         Параметры:
         --users <file.csv> - файл со списком пользователей. По умолчанию будет использован users.csv
+        --workers <N> - количество пользователей, обрабатываемых одновременно. По умолчанию 10.
         """),
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
     parser.add_argument('--users', type=str, required=True, help='Файл со списком пользователей')
+    parser.add_argument('--workers', type=int, default=10, help='Количество пользователей, обрабатываемых одновременно')
     return parser
 
 
@@ -55,54 +56,50 @@ def read_users_csv(file_path: str) -> list[dict]:
         print(f'Файл {file_path} не найден')
         exit(1)
 
-def main(email: str, unpublish: bool, messenger: bool = False):
+async def main(email: str, client: AsyncDiskClient, unpublish: bool, messenger: bool = False):
     try:
-        response = API360.get_service_app_token(
-            client_id=os.getenv('CLIENT_ID'),
-            client_secret=os.getenv('CLIENT_SECRET'),
-            subject_token=email,
-            subject_token_type='urn:yandex:params:oauth:token-type:email'
-        )
-        if 'error' in response:
-            raise Exception(f'{response["error"]}: {response["error_description"]}')
-
+        token = await token_cache().get_async(email, TOKEN_TYPE_EMAIL)
     except Exception as e:
         log.debug(f'User {email} - Failed to get service app token: {e}')
+        raise
+
+    if await client.check_token(token):
+        log.info(f'User {email} - Test service app token: Success')
+    else:
+        log.error(f'User {email} - Test service app token: Failed')
+        raise Exception('Invalid token for user')
+
+    if unpublish:
+        log.info(f'Unpublish resources for user: {email}')
+        # Unpublished resources leave the list, so it is read in full before unpublishing
+        shared_resources: list[Resource] = (await client.get_public_resources(token)).items
+        for resource in shared_resources:
+            if messenger and 'Файлы Мессенджера' in resource.path:
+                log.debug(f'- Skipping Messenger: {resource.path}')
+                continue
+            await client.unpublish(token, resource.path)
+            log.debug(f'- Unpublish: {resource.path}')
+    else:
+        log.info(f'Listing shared resources for user: {email}')
+        async for resource in client.iter_public_resources(token):
+            log.debug(f'- Shared resource: {resource.path}')
+
+
+async def run(users: list[dict], unpublish: bool, messenger: bool, workers: int):
+    emails = [user.get('Email') for user in users if user.get('ID')[:3] == "113"]
+    await token_cache().prefetch(emails, TOKEN_TYPE_EMAIL)
+
+    users_slots = asyncio.Semaphore(workers)
+
+    async def process(user_email: str, client: AsyncDiskClient):
+        async with users_slots:
+            try:
+                await main(email=user_email, client=client, unpublish=unpublish, messenger=messenger)
+            except Exception as e:
+                log.error(f'User {user_email} - {e}')
 
-    token = response['access_token']
-    # print(token)
-    client = yadisk.Client(token=token, session="requests")
-
-    with client:
-
-        if client.check_token():
-            log.info(f'User {email} - Test service app token: Success')
-        else:
-            log.error(f'User {email} - Test service app token: Failed')
-            raise Exception('Invalid token for user')
-
-        
-        shared_resources: list[SyncPublicResourceObject] = client.get_all_public_resources()
-
-        if unpublish and not messenger:
-            log.info(f'Unpublish resources for user: {email}')
-            for resource in shared_resources:
-                resp: SyncResourceLinkObject = client.unpublish(resource.path)
-                log.debug(f'- Unpublish: {resp.path}')
-                sleep(0.1)
-        elif unpublish and messenger:
-            log.info(f'Unpublish resources for user: {email}')
-            for resource in shared_resources:
-                if 'Файлы Мессенджера' in resource.path:
-                    log.debug(f'- Skipping Messenger: {resource.path}')
-                    continue
-                resp: SyncResourceLinkObject = client.unpublish(resource.path)
-                log.debug(f'- Unpublish: {resp.path}')
-                sleep(0.1)
-        else:
-            log.info(f'Listing shared resources for user: {email}')
-            for resource in shared_resources:
-                log.debug(f'- Shared resource: {resource.path}')
+    async with AsyncDiskClient(max_in_flight=workers) as client:
+        await asyncio.gather(*(process(user_email, client) for user_email in emails))
 
 
 if __name__ == "__main__":
@@ -119,20 +116,11 @@ if __name__ == "__main__":
 
     unpublish_choice = input('Выберите: ')
 
+    if unpublish_choice == '1':
+        asyncio.run(run(users, unpublish=False, messenger=False, workers=args.workers))
+    elif unpublish_choice == '2':
+        asyncio.run(run(users, unpublish=True, messenger=False, workers=args.workers))
+    elif unpublish_choice == '3':
+        asyncio.run(run(users, unpublish=True, messenger=True, workers=args.workers))
 
-    
-
-    for user in users:
-        if user.get('ID')[:3] == "113":
-            user_email = user.get('Email')
-            try:
-                if unpublish_choice == '1':
-                    main(email=user_email, unpublish=False)
-                elif unpublish_choice == '2':
-                    main(email=user_email, unpublish=True)
-                elif unpublish_choice == '3':
-                    main(email=user_email, unpublish=True, messenger=True)
-            except Exception as e:
-                log.error(f'User {user_email} - {e}')
-
-    print('Завершено')
\ No newline at end of file
+    print('Завершено')
@@ -0,0 +1,30 @@
+import asyncio
+import logging
+import os
+from time import time
+
+from dotenv import load_dotenv
+
+from lib.api360 import API360
+from lib.groupindex import GroupIndex
+
+
+load_dotenv()
+
+api = API360(api_key=os.getenv('TOKEN'), org_id=os.getenv('ORG_ID'), log_level=logging.INFO)
+
+
+async def main():
+    start_time = time()
+    async with api:
+        users = await api.get_all_users_async()
+        print(f'- Загружено пользователей организации: {len(users)}')
+        index = await GroupIndex.build(api, users)
+        print(f'- Загружено групп: {len(index.groups)}')
+    index.export_csv('user_groups.csv')
+    print(f'- Готово за {round(time() - start_time, 2)} секунд. Результат: user_groups.csv')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
+    exit(0)
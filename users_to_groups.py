@@ -1,24 +1,56 @@
 
+import argparse
+import asyncio
 import csv
 import logging
 import os
+from argparse import ArgumentParser
+from textwrap import dedent
 
 
 from lib.types import User
 
 from dotenv import load_dotenv
 from lib.api360 import API360
+from lib.usercache import UserCache
+from lib.userindex import UserIndex
+from lib.membership import GroupMembershipEngine, MembershipAction
 
 
 load_dotenv()
 
-FETCH_RATE = 0.1
-
 api = API360(api_key=os.getenv('TOKEN'), org_id=os.getenv('ORG_ID'), log_level=logging.INFO)
 
 
-def get_user_by_email(email: str, org_users) -> User:
-    return next((user for user in org_users if user.email == email), None)
+def arg_parser() -> ArgumentParser:
+    parser = ArgumentParser(
+        description=dedent("""
+        Скрипт добавляет пользователей в группы по файлу users_to_groups.csv
+        Параметры:
+        --cache <file.db> - локальный кэш пользователей. Загружаются только изменения с прошлого запуска.
+        --max-age <секунды> - не обращаться к API, если кэш обновлялся не раньше указанного времени.
+        --remove - удалить из групп файла пользователей, которых нет в файле.
+        --workers <N> - количество одновременных запросов. По умолчанию 10.
+        """),
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--cache', type=str, required=False, help='Файл локального кэша пользователей')
+    parser.add_argument('--max-age', type=float, required=False, help='Максимальный возраст кэша в секундах')
+    parser.add_argument('--remove', action='store_true', help='Удалить из групп пользователей, которых нет в файле')
+    parser.add_argument('--workers', type=int, default=10, help='Количество одновременных запросов')
+    return parser
+
+
+async def load_org_users(cache_path: str = None, max_age: float = None) -> list[User]:
+    if not cache_path:
+        return await api.get_all_users_async()
+
+    with UserCache(cache_path) as cache:
+        return await cache.load(api, max_age)
+
+
+def get_user_by_email(email: str, users_index: UserIndex) -> User:
+    return users_index.by_email(email)
 
 def read_users_to_groups_csv(file_path: str) -> list[dict]:
     users_to_groups = []
@@ -37,32 +69,54 @@ def read_users_to_groups_csv(file_path: str) -> list[dict]:
         exit(1)
 
 
-def main():
-    org_users = api.get_all_users()
-    print(f'- Загружено пользователей организации: {len(org_users)}')
-
-    users_to_groups = read_users_to_groups_csv('users_to_groups.csv')
-    print(f'- Загружено пользователей из CSV: {len(users_to_groups)}')
-
-    for user_to_group in users_to_groups:
-        user_email = user_to_group.get('Email')
-        group_id = user_to_group.get('GroupId')
-
-        user = get_user_by_email(user_email, org_users)
-        if user:
-            try:
-                res = api.add_user_to_group(user.uid, int(group_id))
-                if res.get('added'):
-                    print(f'-- {user_email} добавлен в группу {group_id}')
+async def main():
+    args = arg_parser().parse_args()
+    async with api:
+        users_index = UserIndex(await load_org_users(args.cache, args.max_age))
+        print(f'- Загружено пользователей организации: {len(users_index)}')
+
+        users_to_groups = read_users_to_groups_csv('users_to_groups.csv')
+        print(f'- Загружено пользователей из CSV: {len(users_to_groups)}')
+
+        desired: dict[int, set[str]] = {}
+        emails: dict[str, str] = {}
+        for user_to_group in users_to_groups:
+            user_email = user_to_group.get('Email')
+            group_id = int(user_to_group.get('GroupId'))
+
+            user = get_user_by_email(user_email, users_index)
+            if user:
+                desired.setdefault(group_id, set()).add(str(user.uid))
+                emails[str(user.uid)] = user_email
+            else:
+                print(f'-- {user_email} НЕ найден в организации')
+
+        engine = GroupMembershipEngine(api, max_in_flight=args.workers)
+        results, in_place = await engine.sync(desired, remove=args.remove)
+        print(f'- Уже состоят в группах: {in_place}, изменений: {len(results)}')
+
+        for result in results:
+            change = result.change
+            user_email = emails.get(change.user_id, change.user_id)
+            if change.action == MembershipAction.ADD:
+                if result.error:
+                    print(f'-- {user_email} ОШИБКА при добавлении пользователя в группу {change.group_id}: {result.error}')
+                elif result.success:
+                    print(f'-- {user_email} добавлен в группу {change.group_id}')
+                else:
+                    print(f'-- {user_email} НЕ добавлен в группу {change.group_id}')
+            else:
+                if result.error:
+                    print(f'-- {user_email} ОШИБКА при удалении пользователя из группы {change.group_id}: {result.error}')
+                elif result.success:
+                    print(f'-- {user_email} удален из группы {change.group_id}')
                 else:
-                    print(f'-- {user_email} НЕ добавлен в группу {group_id}')
-            except Exception as e:
-                print(f'-- {user_email} ОШИБКА при добавлении пользователя в группу {group_id}: {e}')
+                    print(f'-- {user_email} НЕ удален из группы {change.group_id}')
 
 
 if __name__ == '__main__':
     print('- Старт импорта пользователей в группы')
-    main()
+    asyncio.run(main())
     print('- Завершен импорт пользователей в группы')
 
 